@@ -0,0 +1,122 @@
+import asyncio
+import os
+from fastapi.responses import ORJSONResponse
+from metrics import ADMISSION_REJECTED, COALESCED_REQUESTS, route_label
+
+# Лимиты одновременных запросов по маршрутам: "МЕТОД /шаблон=лимит:очередь" через ";", пусто - выключено.
+# Сумма лимитов маршрутов, идущих в БД, должна быть порядка DB_POOL_SIZE + DB_MAX_OVERFLOW.
+# Очередь карточки продукта длинная: одинаковые запросы склеиваются и почти не нагружают БД
+ROUTE_CONCURRENCY_LIMITS = os.getenv(
+    "ROUTE_CONCURRENCY_LIMITS",
+    "GET /api/products/{product_id}=16:1024;GET /api/products=8:256;GET /api/products/search=8:128;"
+    "POST /api/quote=4:64;POST /api/orders/bulk=2:8;GET /api/orders/export=2:4;GET /api/analytics/sales=4:32",
+)
+# Сколько запрос может ждать в очереди маршрута, прежде чем получить 503
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+# Значение Retry-After в ответе 503, секунды
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+# Одинаковые одновременные чтения каталога выполняются одним запросом к БД
+REQUEST_COALESCING = os.getenv("REQUEST_COALESCING", "true").lower() == "true"
+
+class Overloaded(Exception):
+    pass
+
+class SingleFlight:
+    # Первый запрос с ключом выполняет загрузку, одновременные с ним ждут тот же результат
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._flights: dict = {}
+
+    async def do(self, key, load):
+        # load - функция без аргументов, возвращающая корутину; она не должна использовать
+        # ресурсы вызывающего запроса (сессию БД и т.п.) - ее результат получат и другие запросы
+        if not self.enabled:
+            return await load()
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(load())
+            self._flights[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            COALESCED_REQUESTS.inc()
+        # Отключившийся клиент не отменяет загрузку для остальных ожидающих
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            # Если все ожидающие ушли, исключение не должно попасть в лог как необработанное
+            task.exception()
+
+class ConcurrencyLimiter:
+    # Не больше limit запросов одновременно, еще не больше queue_size ждут; остальным - Overloaded
+    def __init__(self, limit: int, queue_size: int, timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def acquire(self):
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            return
+        if self.waiting >= self.queue_size:
+            raise Overloaded()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise Overloaded()
+        finally:
+            self.waiting -= 1
+
+    def release(self):
+        self._semaphore.release()
+
+def parse_limits(spec: str) -> dict:
+    # "GET /api/products=8:256;..." -> {("GET", "/api/products"): ConcurrencyLimiter(8, 256)}
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(";"))):
+        route, _, values = item.rpartition("=")
+        method, _, path = route.strip().partition(" ")
+        limit, _, queue_size = values.partition(":")
+        limits[(method.upper(), path.strip())] = ConcurrencyLimiter(int(limit), int(queue_size or 0))
+    return limits
+
+class AdmissionMiddleware:
+    # Чистый ASGI middleware: лишние запросы получают 503 сразу, а не ждут соединения из пула БД
+    def __init__(self, app, routes, limits: dict):
+        self.app = app
+        self.routes = routes
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.limits:
+            await self.app(scope, receive, send)
+            return
+        labels = (scope["method"], route_label(self.routes, scope))
+        limiter = self.limits.get(labels)
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await limiter.acquire()
+        except Overloaded:
+            ADMISSION_REJECTED.inc(labels)
+            response = ORJSONResponse(
+                {"detail": "Server is busy, retry later"},
+                status_code=503,
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+catalog_flight = SingleFlight(enabled=REQUEST_COALESCING)
+route_limits = parse_limits(ROUTE_CONCURRENCY_LIMITS)
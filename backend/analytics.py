@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from typing import Optional
+from sqlalchemy import delete, func, insert, literal_column, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database import DATABASE_URL, AsyncSessionLocal
+from models import Order, SalesRollup
+
+ROLLUP_KEY = ("day", "product_id", "source", "status")
+UNKNOWN_SOURCE = "unknown"
+
+def order_day(created_at: datetime) -> date:
+    # Дни считаются в UTC; SQLite возвращает naive datetime уже в UTC
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc)
+    return created_at.date()
+
+def _rollup_key(order, status: Optional[str] = None):
+    return (order_day(order.created_at), order.product_id, order.source or UNKNOWN_SOURCE, status or order.status)
+
+def _upsert_statement():
+    insert_fn = sqlite_insert if DATABASE_URL.startswith("sqlite") else pg_insert
+    stmt = insert_fn(SalesRollup)
+    return stmt.on_conflict_do_update(
+        index_elements=list(ROLLUP_KEY),
+        set_={
+            "order_count": SalesRollup.order_count + stmt.excluded.order_count,
+            "total_sqm": SalesRollup.total_sqm + stmt.excluded.total_sqm,
+            "revenue": SalesRollup.revenue + stmt.excluded.revenue,
+        },
+    )
+
+async def _apply_deltas(db, deltas: dict):
+    rows = [
+        dict(zip(ROLLUP_KEY, key), order_count=count, total_sqm=sqm, revenue=revenue)
+        for key, (count, sqm, revenue) in deltas.items()
+        if count or sqm or revenue
+    ]
+    if rows:
+        await db.execute(_upsert_statement(), rows)
+
+async def record_orders(db, orders):
+    # Вызывается в той же транзакции, что и вставка заказов; заказы должны иметь created_at
+    deltas = defaultdict(lambda: [0, 0.0, 0.0])
+    for order in orders:
+        delta = deltas[_rollup_key(order)]
+        delta[0] += 1
+        delta[1] += order.quantity_sqm or 0
+        delta[2] += order.total_price or 0
+    await _apply_deltas(db, deltas)
+
+async def record_status_change(db, order, old_status: str):
+    # Переносим заказ из корзины старого статуса в корзину нового
+    sqm = order.quantity_sqm or 0
+    revenue = order.total_price or 0
+    deltas = {
+        _rollup_key(order, old_status): (-1, -sqm, -revenue),
+        _rollup_key(order): (1, sqm, revenue),
+    }
+    await _apply_deltas(db, deltas)
+
+def _day_expression():
+    if DATABASE_URL.startswith("sqlite"):
+        return func.date(Order.created_at)
+    return func.date(func.timezone(literal_column("'UTC'"), Order.created_at))
+
+async def rebuild_rollups(db):
+    # Полный пересчет агрегатов по истории заказов
+    await db.execute(delete(SalesRollup))
+    day = _day_expression()
+    source = func.coalesce(Order.source, UNKNOWN_SOURCE)
+    history = select(
+        day,
+        Order.product_id,
+        source,
+        Order.status,
+        func.count(Order.id),
+        func.coalesce(func.sum(Order.quantity_sqm), 0),
+        func.coalesce(func.sum(Order.total_price), 0),
+    ).where(Order.product_id.is_not(None), Order.status.is_not(None)).group_by(day, Order.product_id, source, Order.status)
+    await db.execute(
+        insert(SalesRollup).from_select(
+            [*ROLLUP_KEY, "order_count", "total_sqm", "revenue"], history
+        )
+    )
+
+def build_sales_query(
+    group_by: list[str],
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    product_id: Optional[int] = None,
+    source: Optional[str] = None,
+    status: Optional[str] = None,
+):
+    dimensions = [getattr(SalesRollup, name) for name in group_by]
+    query = select(
+        *dimensions,
+        func.coalesce(func.sum(SalesRollup.order_count), 0).label("order_count"),
+        func.coalesce(func.sum(SalesRollup.total_sqm), 0).label("total_sqm"),
+        func.coalesce(func.sum(SalesRollup.revenue), 0).label("revenue"),
+    )
+    if date_from:
+        query = query.where(SalesRollup.day >= date_from)
+    if date_to:
+        query = query.where(SalesRollup.day <= date_to)
+    if product_id is not None:
+        query = query.where(SalesRollup.product_id == product_id)
+    if source:
+        query = query.where(SalesRollup.source == source)
+    if status:
+        query = query.where(SalesRollup.status == status)
+    if dimensions:
+        query = query.group_by(*dimensions).order_by(*dimensions)
+    return query
+
+async def _rebuild():
+    async with AsyncSessionLocal() as db:
+        await rebuild_rollups(db)
+        await db.commit()
+        count = await db.scalar(select(func.count(SalesRollup.id)))
+    print(f"✅ Агрегаты продаж пересчитаны: {count} строк")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sales analytics rollups")
+    parser.add_argument("command", choices=["rebuild"])
+    args = parser.parse_args()
+    if args.command == "rebuild":
+        asyncio.run(_rebuild())
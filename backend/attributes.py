@@ -0,0 +1,76 @@
+import re
+from typing import Optional
+from sqlalchemy import Integer, and_, column, event, inspect, select, table, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session
+from database import DATABASE_URL
+from models import Product
+
+# Подпись характеристики в specifications -> (ключ в Product.attributes, единица измерения числа).
+# Неизвестные подписи сохраняются как есть строкой под ключом "подпись" в нижнем регистре
+ATTRIBUTE_LABELS = {
+    "толщина": ("thickness_mm", "мм"),
+    "ширина": ("width_mm", "мм"),
+    "длина панели": ("panel_length_m", "м"),
+    "покрытие": ("coating", None),
+    "профиль": ("profile", None),
+    "материал": ("material", None),
+    "цвет": ("color", None),
+}
+ATTRIBUTE_TYPES = {key: float if unit else str for key, unit in ATTRIBUTE_LABELS.values()}
+
+# Пары разделяет запятая перед "Подпись:" - десятичная запятая ("0,5мм") остается в значении
+PAIR_SEPARATOR = re.compile(r",\s*(?=[^,:]+:)")
+NUMBER = re.compile(r"\d+(?:[.,]\d+)?")
+
+# Индекс атрибутов в SQLite: строки (product_id, name, value) поддерживают триггеры на products
+# (миграция 0004), поиск идет по индексу (name, value). В PostgreSQL - GIN по products.attributes
+product_attributes = table(
+    "product_attributes",
+    column("product_id", Integer),
+    column("name"),
+    column("value"),
+)
+
+def parse_specifications(specifications: Optional[str]) -> Optional[dict]:
+    # "Толщина: 0.5мм, Покрытие: полиэстер" -> {"thickness_mm": 0.5, "coating": "полиэстер"}
+    attributes = {}
+    for pair in PAIR_SEPARATOR.split((specifications or "").strip()):
+        label, _, value = pair.partition(":")
+        label, value = label.strip().lower(), value.strip()
+        if not label or not value:
+            continue
+        key, unit = ATTRIBUTE_LABELS.get(label, (label, None))
+        if unit:
+            number = NUMBER.search(value)
+            if number:
+                attributes[key] = float(number.group().replace(",", "."))
+        else:
+            attributes[key] = value
+    return attributes or None
+
+def attribute_filter(filters: dict):
+    # Продукты, у которых есть все атрибуты filters: в PostgreSQL один @> по GIN-индексу,
+    # в SQLite - пересечение выборок из product_attributes по индексу (name, value)
+    if not DATABASE_URL.startswith("sqlite"):
+        return type_coerce(Product.attributes, JSONB).contains(filters)
+    return and_(*(
+        Product.id.in_(
+            select(product_attributes.c.product_id)
+            .where(product_attributes.c.name == name, product_attributes.c.value == value)
+        )
+        for name, value in filters.items()
+    ))
+
+@event.listens_for(Session, "before_flush")
+def _fill_attributes(session, flush_context, instances):
+    # Если attributes не переданы явно, они разбираются из specifications - так их заполняют
+    # и API, и seed.py; при смене specifications без новых attributes разбор повторяется
+    for obj in session.new:
+        if isinstance(obj, Product) and obj.attributes is None:
+            obj.attributes = parse_specifications(obj.specifications)
+    for obj in session.dirty:
+        if isinstance(obj, Product):
+            state = inspect(obj).attrs
+            if state.specifications.history.has_changes() and not state.attributes.history.has_changes():
+                obj.attributes = parse_specifications(obj.specifications)
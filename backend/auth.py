@@ -1,27 +1,42 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from database import SessionLocal
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal
 from models import User
+from cache import MemoryCache
 import os
 
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+
+# bcrypt намеренно медленный (~100 мс), поэтому он выполняется в ограниченном пуле потоков
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "4"))
+# Кэш расшифрованных токенов и пользователей (в пределах процесса)
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def get_db():
-    db = SessionLocal()
-    try:
+_hash_executor = ThreadPoolExecutor(max_workers=AUTH_HASH_WORKERS, thread_name_prefix="bcrypt")
+_token_cache = MemoryCache(AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_TTL)
+_user_cache = MemoryCache(AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_TTL)
+
+# Хэш для сравнения, когда пользователь не найден: время ответа не выдает, существует ли логин
+_DUMMY_HASH = pwd_context.hash("dummy-password")
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -29,14 +44,24 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
-def get_user(db: Session, username: str):
-    return db.query(User).filter(User.username == username).first()
+async def verify_password_async(plain_password, hashed_password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, get_password_hash, password)
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = get_user(db, username)
+async def get_user(db: AsyncSession, username: str):
+    result = await db.execute(select(User).where(User.username == username))
+    return result.scalars().first()
+
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await get_user(db, username)
     if not user:
+        await verify_password_async(password, _DUMMY_HASH)
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return False
     return user
 
@@ -50,20 +75,56 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def invalidate_user(username: str):
+    _user_cache.discard(username)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    # Деактивация или изменение пользователя через ORM сразу сбрасывает его из кэша;
+    # массовые UPDATE в обход ORM видны только после AUTH_CACHE_TTL
+    invalidate_user(target.username)
+    for old_username in inspect(target).attrs.username.history.deleted or ():
+        invalidate_user(old_username)
+
+async def _get_token_subject(token: str) -> Optional[str]:
+    cached = await _token_cache.get(token)
+    if cached is not None:
+        # exp - секунды Unix в UTC, поэтому сравниваем с time.time(), а не с naive utcnow().timestamp(),
+        # которое на серверах с часовым поясом западнее UTC сдвинуто на смещение пояса
+        username, expires_at = cached
+        if expires_at > time.time():
+            return username
+        # Истекшую запись проверяет jwt.decode: он же отклонит просроченный токен
+        _token_cache.discard(token)
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    username = payload.get("sub")
+    if username is None:
+        return None
+    await _token_cache.set(token, (username, payload.get("exp", 0)))
+    return username
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
+    username = await _get_token_subject(token)
+    if username is None:
         raise credentials_exception
-    user = get_user(db, username=username)
+
+    # Пользователь из кэша отсоединен от сессии: связи (orders) у него не подгружаются
+    user = await _user_cache.get(username)
     if user is None:
+        user = await get_user(db, username=username)
+        if user is None:
+            raise credentials_exception
+        db.expunge(user)
+        await _user_cache.set(username, user)
+    if not user.is_active:
         raise credentials_exception
-    return user
\ No newline at end of file
+    return user
@@ -0,0 +1,246 @@
+"""Нагрузочный бенчмарк основных эндпоинтов API: пропускная способность и p50/p95/p99.
+
+Приложение работает в том же процессе (ASGI-транспорт httpx) поверх SQLite-базы
+заданного размера. Результаты пишутся в JSON; с --baseline они сравниваются
+с сохраненным прогоном, и при регрессии скрипт завершается с кодом 1.
+
+Запуск из каталога backend:
+    python benchmarks/api_load.py --products 10000 --orders 1000000 --db /tmp/bench.db \\
+        --concurrency 1 8 32 --requests 1000 --output bench.json
+    python benchmarks/api_load.py --db /tmp/bench.db --output new.json --baseline bench.json
+
+С --db заполненная база переиспользуется между запусками (1М заказов заполняются около минуты).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CATEGORIES = ["Кровельные материалы", "Фасадные материалы", "Водосточные системы", "Комплектующие"]
+STATUSES = ["pending", "confirmed", "completed", "cancelled"]
+SOURCES = ["website", "mobile", "telegram"]
+SEED_BATCH_SIZE = 20000
+WARMUP_REQUESTS = 20
+
+def make_product(i: int) -> dict:
+    rnd = random.Random(i)
+    return {
+        "name": f"Профнастил арт{i}",
+        "description": "Профнастил для кровли и фасадов, оцинковка с полимерным покрытием",
+        "price_per_sqm": rnd.randint(200, 1200),
+        "category": rnd.choice(CATEGORIES),
+        "image_url": "",
+        "specifications": f"Толщина: 0.{rnd.randint(4, 7)}мм",
+        "is_available": True,
+    }
+
+def make_order(i: int, products: int, rnd: random.Random) -> dict:
+    return {
+        "customer_name": f"Клиент {i}",
+        "customer_email": f"client{i}@example.com",
+        "customer_phone": "+70000000000",
+        "product_id": rnd.randint(1, products),
+        "quantity_sqm": float(rnd.randint(1, 200)),
+        "source": rnd.choice(SOURCES),
+    }
+
+def seed(engine, products: int, orders: int):
+    from sqlalchemy import func, insert, select
+    from models import Order, Product
+
+    with engine.begin() as conn:
+        existing_products = conn.scalar(select(func.count(Product.id)))
+        existing_orders = conn.scalar(select(func.count(Order.id)))
+    if existing_products >= products and existing_orders >= orders:
+        print(f"database: {existing_products} products, {existing_orders} orders (reused)")
+        return existing_products
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        for offset in range(existing_products, products, SEED_BATCH_SIZE):
+            conn.execute(insert(Product), [make_product(i) for i in range(offset, min(offset + SEED_BATCH_SIZE, products))])
+
+    # Заказы распределены по последнему году, чтобы выборки по created_at были реалистичными
+    rnd = random.Random(orders)
+    start = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=365)
+    step = timedelta(days=365) / max(orders, 1)
+    total_products = max(products, existing_products)
+    for offset in range(existing_orders, orders, SEED_BATCH_SIZE):
+        rows = []
+        for i in range(offset, min(offset + SEED_BATCH_SIZE, orders)):
+            row = make_order(i, total_products, rnd)
+            row["status"] = rnd.choice(STATUSES)
+            row["created_at"] = start + step * i
+            row["total_price"] = row["quantity_sqm"] * 500
+            rows.append(row)
+        with engine.begin() as conn:
+            conn.execute(insert(Order), rows)
+    print(f"database: {total_products} products, {max(orders, existing_orders)} orders "
+          f"(seeded in {time.perf_counter() - started:.1f}s)")
+    return total_products
+
+def make_scenarios(products: int) -> dict:
+    # Каждый сценарий - функция (client, rnd, i) -> ответ
+    def products_list(client, rnd, i):
+        return client.get("/api/products", params={"limit": 50, "skip": rnd.randint(0, 20) * 50})
+
+    def product_detail(client, rnd, i):
+        return client.get(f"/api/products/{rnd.randint(1, products)}")
+
+    def orders_list(client, rnd, i):
+        params = {"limit": 50}
+        if i % 2:
+            params["status"] = rnd.choice(STATUSES)
+        return client.get("/api/orders", params=params)
+
+    def order_create(client, rnd, i):
+        return client.post("/api/orders", json=make_order(i, products, rnd))
+
+    return {
+        "products_list": products_list,
+        "product_detail": product_detail,
+        "orders_list": orders_list,
+        "order_create": order_create,
+    }
+
+def percentile(sorted_values: list, q: float) -> float:
+    # Ранговый перцентиль без интерполяции
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+async def measure(client, scenario, requests: int, concurrency: int, seed_value: int) -> dict:
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker(worker_id: int):
+        nonlocal errors
+        rnd = random.Random(seed_value * 1000 + worker_id)
+        for i in counter:
+            started = time.perf_counter()
+            response = await scenario(client, rnd, i)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(worker_id) for worker_id in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+async def run(args) -> dict:
+    import httpx
+    from database import engine, run_migrations
+    from main import app
+
+    run_migrations()
+    products = seed(engine, args.products, args.orders)
+    scenarios = make_scenarios(products)
+    selected = args.scenarios or list(scenarios)
+
+    results = []
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        await app.router.startup()
+        for name in selected:
+            await measure(client, scenarios[name], WARMUP_REQUESTS, 1, 0)
+            for concurrency in args.concurrency:
+                result = dict(scenario=name, concurrency=concurrency,
+                              **await measure(client, scenarios[name], args.requests, concurrency, concurrency))
+                results.append(result)
+                print(f"{name:<15} c={concurrency:<4} {result['rps']:>8.1f} req/s  "
+                      f"p50 {result['p50_ms']:7.2f}  p95 {result['p95_ms']:7.2f}  p99 {result['p99_ms']:7.2f} ms"
+                      + (f"  errors {result['errors']}" if result["errors"] else ""))
+        await app.router.shutdown()
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "products": args.products,
+            "orders": args.orders,
+            "requests": args.requests,
+        },
+        "results": results,
+    }
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    # Регрессия: пропускная способность упала или p95/p99 выросли больше чем на threshold
+    base = {(row["scenario"], row["concurrency"]): row for row in baseline["results"]}
+    regressions = []
+    print(f"\ncomparison with baseline from {baseline['meta'].get('timestamp', '?')} (threshold {threshold:.0%}):")
+    for row in current["results"]:
+        old = base.get((row["scenario"], row["concurrency"]))
+        if old is None:
+            continue
+        problems = []
+        if row["rps"] < old["rps"] * (1 - threshold):
+            problems.append("rps")
+        for key in ("p95_ms", "p99_ms"):
+            if row[key] > old[key] * (1 + threshold):
+                problems.append(key)
+        rps_delta = row["rps"] / old["rps"] - 1 if old["rps"] else 0.0
+        p95_delta = row["p95_ms"] / old["p95_ms"] - 1 if old["p95_ms"] else 0.0
+        mark = "REGRESSION " + ",".join(problems) if problems else "ok"
+        print(f"{row['scenario']:<15} c={row['concurrency']:<4} rps {rps_delta:+7.1%}  p95 {p95_delta:+7.1%}  {mark}")
+        if problems:
+            regressions.append(dict(scenario=row["scenario"], concurrency=row["concurrency"], metrics=problems))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--db", help="путь к SQLite-базе (по умолчанию - временная)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=500, help="запросов на сценарий и уровень конкурентности")
+    parser.add_argument("--scenarios", nargs="+", choices=["products_list", "product_detail", "orders_list", "order_create"])
+    parser.add_argument("--output", default="bench.json")
+    parser.add_argument("--baseline", help="JSON предыдущего прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.15, help="допустимое ухудшение, доля")
+    args = parser.parse_args()
+
+    db_path = os.path.abspath(args.db) if args.db else os.path.join(tempfile.mkdtemp(), "bench.db")
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    # Кэш каталога - в памяти процесса, чтобы результаты не зависели от внешнего Redis
+    os.environ["REDIS_URL"] = ""
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+
+    report = asyncio.run(run(args))
+    regressions = []
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        report["regressions"] = regressions
+
+    with open(output, "w") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nresults written to {output}")
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
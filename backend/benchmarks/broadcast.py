@@ -0,0 +1,117 @@
+"""Рассылка broadcast.py против локальной заглушки Bot API: пропускная способность, 429 и продолжение.
+
+Сценарии (заглушка в том же процессе, ASGI-транспорт httpx, временная SQLite-база):
+  throughput - --recipients получателей, заглушка без общего лимита: потолок самого движка;
+  limits     - заглушка с лимитом --stub-rate в секунду, движок ниже и выше лимита: сколько 429 и дублей;
+  resume     - рассылка прерывается на середине и продолжается с контрольной точки.
+
+Запуск из каталога backend:
+    python benchmarks/broadcast.py --recipients 100000 --concurrency 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BLOCKED_EVERY = 50
+TELEGRAM_ID_BASE = 5_000_000_000  # id пользователей Telegram больше 2^32
+
+def reset_users(engine, count: int):
+    from sqlalchemy import delete, insert
+    from models import TelegramUser
+
+    with engine.begin() as conn:
+        conn.execute(delete(TelegramUser))
+        for offset in range(0, count, 20000):
+            conn.execute(insert(TelegramUser), [
+                {"telegram_id": TELEGRAM_ID_BASE + i, "first_name": f"Клиент {i}", "is_active": True}
+                for i in range(offset, min(offset + 20000, count))
+            ])
+
+async def broadcast_once(stub, recipients: int, rate: float, concurrency: int, chunk_size: int,
+                         stop_after: int = 0) -> tuple:
+    import httpx
+    from broadcast import BotApi, create_broadcast, run_broadcast
+
+    api = BotApi(token="bench", api_url="http://telegram", max_connections=concurrency,
+                 transport=httpx.ASGITransport(app=stub.app))
+    broadcast_id = await create_broadcast("Новые цены на профнастил с понедельника")
+    started = time.perf_counter()
+    task = asyncio.create_task(run_broadcast(broadcast_id, api, rate=rate, concurrency=concurrency, chunk_size=chunk_size))
+    if stop_after:
+        # Имитация падения процесса посреди рассылки
+        while stub.messages < stop_after:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        task = asyncio.create_task(run_broadcast(broadcast_id, api, rate=rate, concurrency=concurrency, chunk_size=chunk_size))
+    broadcast = await task
+    elapsed = time.perf_counter() - started
+    await api.close()
+    return broadcast, elapsed
+
+def report(name: str, stub, broadcast, elapsed: float, recipients: int):
+    expected = recipients - recipients // BLOCKED_EVERY
+    duplicates = sum(count - 1 for count in stub.delivered.values() if count > 1)
+    missing = expected - len(stub.delivered)
+    print(f"{name:<34} {recipients:>7} recipients  {elapsed:7.1f} s  {len(stub.delivered) / elapsed:7.0f} msg/s  "
+          f"sent {broadcast.sent}  blocked {broadcast.blocked}  failed {broadcast.failed}  "
+          f"429 {stub.rate_limited}  duplicates {duplicates}  missing {missing}")
+
+async def run(args):
+    from sqlalchemy import func, select
+    from database import AsyncSessionLocal, engine, run_migrations
+    from models import TelegramUser
+    from telegram_stub import TelegramStub
+
+    run_migrations()
+
+    reset_users(engine, args.recipients)
+    stub = TelegramStub(rate=0, latency=args.latency, blocked_every=BLOCKED_EVERY)
+    broadcast, elapsed = await broadcast_once(stub, args.recipients, 0, args.concurrency, args.chunk_size)
+    report("throughput, no rate limit", stub, broadcast, elapsed, args.recipients)
+    print(f"{'':<34} at {args.telegram_rate:g} msg/s (Telegram limit) {args.recipients} recipients take "
+          f"{args.recipients / args.telegram_rate / 60:.0f} min")
+
+    for rate in (args.stub_rate * 0.9, args.stub_rate * 1.5):
+        reset_users(engine, args.limits_recipients)
+        stub = TelegramStub(rate=args.stub_rate, latency=args.latency, blocked_every=BLOCKED_EVERY)
+        broadcast, elapsed = await broadcast_once(stub, args.limits_recipients, rate, args.concurrency, args.chunk_size)
+        report(f"limit {args.stub_rate:g}/s, engine {rate:g}/s", stub, broadcast, elapsed, args.limits_recipients)
+
+    reset_users(engine, args.limits_recipients)
+    stub = TelegramStub(rate=0, latency=args.latency, blocked_every=BLOCKED_EVERY)
+    broadcast, elapsed = await broadcast_once(stub, args.limits_recipients, 0, args.concurrency, args.chunk_size,
+                                              stop_after=args.limits_recipients // 2)
+    report(f"resume, chunk {args.chunk_size}", stub, broadcast, elapsed, args.limits_recipients)
+    async with AsyncSessionLocal() as db:
+        inactive = await db.scalar(select(func.count(TelegramUser.id)).where(TelegramUser.is_active.is_(False)))
+    print(f"{'':<34} deactivated users: {inactive}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recipients", type=int, default=100000)
+    parser.add_argument("--limits-recipients", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка ответа заглушки, с")
+    parser.add_argument("--stub-rate", type=float, default=1000, help="лимит заглушки в сценарии limits, msg/s")
+    parser.add_argument("--telegram-rate", type=float, default=25, help="BROADCAST_RATE для оценки времени")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    sys.path.insert(0, BACKEND_DIR)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(BACKEND_DIR)
+
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Сравнение POST /api/orders (по одному заказу) и POST /api/orders/bulk.
+
+Запуск из каталога backend:
+    python benchmarks/bulk_orders.py --orders 2000 --batch-size 500
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def make_order(i: int) -> dict:
+    return {
+        "customer_name": f"Клиент {i}",
+        "customer_email": f"client{i}@example.com",
+        "customer_phone": "+70000000000",
+        "product_id": 1 + i % 3,
+        "quantity_sqm": 10.0 + i % 50,
+        "source": "mobile",
+    }
+
+async def run(orders: int, batch_size: int):
+    import httpx
+    from database import AsyncSessionLocal, run_migrations
+    from main import app
+    from seed import seed_products
+
+    run_migrations()
+    async with AsyncSessionLocal() as db:
+        await seed_products(db)
+
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        await app.router.startup()
+        payload = [make_order(i) for i in range(orders)]
+
+        started = time.perf_counter()
+        for order in payload:
+            response = await client.post("/api/orders", json=order)
+            response.raise_for_status()
+        single = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for offset in range(0, orders, batch_size):
+            response = await client.post("/api/orders/bulk", json=payload[offset:offset + batch_size])
+            response.raise_for_status()
+        bulk = time.perf_counter() - started
+
+    print(f"orders: {orders}, batch size: {batch_size}")
+    print(f"single: {single:.3f}s ({orders / single:.0f} orders/s)")
+    print(f"bulk:   {bulk:.3f}s ({orders / bulk:.0f} orders/s)")
+    print(f"speedup: x{single / bulk:.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    # Отдельная временная SQLite-база, чтобы не трогать рабочую
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["ORDERS_BULK_MAX_ITEMS"] = str(max(args.batch_size, 1))
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+
+    asyncio.run(run(args.orders, args.batch_size))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Время холодного старта сервера: от запуска процесса до /health и до /ready.
+
+Сервер запускается отдельным процессом на временной SQLite-базе (миграции и seed
+выполняются заранее, один раз), затем опрашиваются /health и /ready.
+
+Запуск из каталога backend:
+    python benchmarks/cold_start.py --server uvicorn --runs 5
+    python benchmarks/cold_start.py --server gunicorn --workers 4 --runs 5
+    python benchmarks/cold_start.py --server gunicorn --workers 4 --no-preload
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POLL_INTERVAL = 0.005
+
+def server_command(server: str, port: int, workers: int) -> list:
+    if server == "gunicorn":
+        return [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app",
+                "--bind", f"127.0.0.1:{port}", "--workers", str(workers)]
+    return [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers)]
+
+def wait_for(client, url: str, deadline: float) -> float:
+    import httpx
+
+    while time.perf_counter() < deadline:
+        try:
+            if client.get(url).status_code == 200:
+                return time.perf_counter()
+        except httpx.TransportError:
+            pass
+        time.sleep(POLL_INTERVAL)
+    raise TimeoutError(url)
+
+def measure(command: list, env: dict, port: int, timeout: float) -> tuple:
+    import httpx
+
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1) as client:
+            deadline = started + timeout
+            healthy = wait_for(client, "/health", deadline)
+            ready = wait_for(client, "/ready", deadline)
+    finally:
+        process.terminate()
+        process.wait()
+    return (healthy - started) * 1000, (ready - started) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--server", choices=["uvicorn", "gunicorn"], default="uvicorn")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--no-preload", action="store_true", help="gunicorn без preload_app")
+    parser.add_argument("--no-warmup", action="store_true", help="APP_WARMUP=false")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", REDIS_URL="")
+    env["GUNICORN_PRELOAD"] = "false" if args.no_preload else "true"
+    env["APP_WARMUP"] = "false" if args.no_warmup else "true"
+
+    # Схема и данные готовятся один раз, как при релизе, а не при каждом старте
+    subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=BACKEND_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    subprocess.run([sys.executable, "seed.py"], cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+
+    command = server_command(args.server, args.port, args.workers)
+    results = [measure(command, env, args.port, args.timeout) for _ in range(args.runs)]
+    health = [healthy for healthy, _ in results]
+    ready = [ready for _, ready in results]
+    print(f"{args.server}, workers: {args.workers}, runs: {args.runs}")
+    print(f"/health: median {statistics.median(health):7.1f} ms  min {min(health):7.1f} ms")
+    print(f"/ready:  median {statistics.median(ready):7.1f} ms  min {min(ready):7.1f} ms")
+
+if __name__ == "__main__":
+    main()
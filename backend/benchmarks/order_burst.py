@@ -0,0 +1,86 @@
+"""Всплеск POST /api/orders: групповой коммит против коммита на каждый заказ.
+
+Запуск из каталога backend:
+    python benchmarks/order_burst.py --orders 2000 --concurrency 10 100
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def make_order(i: int) -> dict:
+    return {
+        "customer_name": f"Клиент {i}",
+        "customer_email": f"client{i}@example.com",
+        "customer_phone": "+70000000000",
+        "product_id": 1 + i % 3,
+        "quantity_sqm": 10.0 + i % 50,
+        "source": "website",
+    }
+
+async def burst(client, orders: int, concurrency: int) -> tuple:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def send(i: int):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post("/api/orders", json=make_order(i))
+                if response.status_code != 200:
+                    errors += 1
+            except Exception:
+                # Например, "database is locked" у SQLite при конкурентных коммитах
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(i) for i in range(orders)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return orders / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99) - 1], errors
+
+async def run(orders: int, levels: list):
+    import httpx
+    from database import AsyncSessionLocal, run_migrations
+    from main import app
+    from orders import order_batcher
+    from seed import seed_products
+
+    run_migrations()
+    async with AsyncSessionLocal() as db:
+        await seed_products(db)
+
+    async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=120) as client:
+        await app.router.startup()
+        for concurrency in levels:
+            for enabled in (False, True):
+                order_batcher.enabled = enabled
+                rate, p50, p99, errors = await burst(client, orders, concurrency)
+                mode = "group commit" if enabled else "per order   "
+                print(f"c={concurrency:<4} {mode}  {rate:7.0f} orders/s  p50 {p50:7.1f} ms  p99 {p99:7.1f} ms  errors {errors}")
+        await app.router.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 100])
+    args = parser.parse_args()
+
+    # Отдельная временная SQLite-база, чтобы не трогать рабочую
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["REDIS_URL"] = ""
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+
+    asyncio.run(run(args.orders, args.concurrency))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""GET /api/orders/stream: стоимость простаивающих подписчиков, задержка доставки и продолжение по Last-Event-ID.
+
+Подписчики подключаются к ASGI-приложению напрямую (без сокетов), поэтому замер показывает
+стоимость самого сервера: память и задачи asyncio на подписчика, время от ответа POST/PATCH до
+получения события каждым подписчиком. Временная SQLite-база, лента в режиме memory.
+
+Запуск из каталога backend:
+    python benchmarks/order_stream.py --subscribers 5000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def make_order(i: int) -> dict:
+    return {
+        "customer_name": f"Клиент {i}",
+        "customer_email": f"client{i}@example.com",
+        "customer_phone": "+70000000000",
+        "product_id": 1 + i % 3,
+        "quantity_sqm": 10.0 + i % 50,
+        "source": "website",
+    }
+
+class Subscriber:
+    # Клиент SSE на уровне ASGI: запоминает, когда пришло каждое событие
+    def __init__(self, app, last_event_id=None):
+        self.app = app
+        self.headers = [(b"last-event-id", str(last_event_id).encode())] if last_event_id is not None else []
+        self.events = []  # (время получения, id, тип)
+        self.buffer = b""
+        self.received = asyncio.Event()
+        self._disconnect = asyncio.Event()
+        self._sent_request = False
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.app(self._scope(), self._receive, self._send))
+
+    def _scope(self) -> dict:
+        return {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": "/api/orders/stream", "raw_path": b"/api/orders/stream", "root_path": "", "query_string": b"",
+            "headers": [(b"host", b"bench"), *self.headers], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+        }
+
+    async def _receive(self) -> dict:
+        if not self._sent_request:
+            self._sent_request = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self._disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def _send(self, message: dict):
+        if message["type"] != "http.response.body":
+            return
+        self.buffer += message.get("body", b"")
+        now = time.perf_counter()
+        while b"\n\n" in self.buffer:
+            frame, self.buffer = self.buffer.split(b"\n\n", 1)
+            fields = dict(line.split(": ", 1) for line in frame.decode().splitlines() if ": " in line and not line.startswith(":"))
+            if "event" in fields:
+                self.events.append((now, int(fields.get("id", 0)), fields["event"]))
+                self.received.set()
+
+    async def close(self):
+        self._disconnect.set()
+        await self.task
+
+def percentile(values: list, share: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+async def wait_all(subscribers: list, count: int, timeout: float = 30):
+    deadline = time.perf_counter() + timeout
+    while any(len(s.events) < count for s in subscribers) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.005)
+
+async def run(args):
+    import httpx
+    from sqlalchemy import text
+    from database import AsyncSessionLocal, run_migrations
+    from feed import order_feed
+    from main import app
+    from seed import seed_products
+
+    run_migrations()
+    async with AsyncSessionLocal() as db:
+        await seed_products(db)
+    order_feed.heartbeat = args.heartbeat
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        # Простаивающие подписчики
+        tracemalloc.start()
+        baseline_memory = tracemalloc.get_traced_memory()[0]
+        baseline_tasks = len(asyncio.all_tasks())
+        subscribers = [Subscriber(app) for _ in range(args.subscribers)]
+        started = time.perf_counter()
+        for subscriber in subscribers:
+            subscriber.start()
+        while order_feed.subscribers < args.subscribers:
+            await asyncio.sleep(0.01)
+        connect_time = time.perf_counter() - started
+        await asyncio.sleep(0.5)
+        memory = tracemalloc.get_traced_memory()[0] - baseline_memory
+        tasks = len(asyncio.all_tasks()) - baseline_tasks
+        tracemalloc.stop()
+        print(f"{'idle subscribers':<28} {args.subscribers:>6}  connect {connect_time:5.2f} s  "
+              f"{memory / args.subscribers / 1024:6.1f} KiB/subscriber  {tasks / args.subscribers:.1f} tasks/subscriber")
+
+        # Задержка доставки: от ответа POST /api/orders до события у каждого подписчика
+        for attempt in range(args.rounds):
+            response = await client.post("/api/orders", json=make_order(attempt))
+            committed = time.perf_counter()
+            order_id = response.json()["id"]
+            await wait_all(subscribers, 2 * attempt + 1)
+            delays = [(s.events[2 * attempt][0] - committed) * 1000 for s in subscribers if len(s.events) > 2 * attempt]
+            await client.patch(f"/api/orders/{order_id}", json={"status": "confirmed"})
+            committed = time.perf_counter()
+            await wait_all(subscribers, 2 * attempt + 2)
+            status_delays = [(s.events[2 * attempt + 1][0] - committed) * 1000
+                             for s in subscribers if len(s.events) > 2 * attempt + 1]
+            print(f"{f'fan-out, round {attempt + 1}':<28} created: {len(delays)}/{args.subscribers} "
+                  f"p50 {percentile(delays, 0.5):6.1f} ms  p99 {percentile(delays, 0.99):6.1f} ms  "
+                  f"max {max(delays):6.1f} ms   status: {len(status_delays)}/{args.subscribers} "
+                  f"p99 {percentile(status_delays, 0.99):6.1f} ms")
+        await asyncio.gather(*(s.close() for s in subscribers))
+
+        # Продолжение: подписчик отключился, пропустил --missed заказов и вернулся с Last-Event-ID
+        listener = Subscriber(app)
+        listener.start()
+        await client.post("/api/orders", json=make_order(0))
+        await wait_all([listener], 1)
+        await listener.close()
+        last_event_id = listener.events[-1][1]
+        created = 0
+        for offset in range(0, args.missed, 500):
+            batch = [make_order(i) for i in range(offset, min(offset + 500, args.missed))]
+            created += (await client.post("/api/orders/bulk", json=batch)).json()["created"]
+        resumed = Subscriber(app, last_event_id)
+        started = time.perf_counter()
+        resumed.start()
+        await wait_all([resumed], created)
+        ids = [event_id for _, event_id, _ in resumed.events]
+        in_order = ids == sorted(ids) and len(set(ids)) == len(ids)
+        print(f"{'resume via Last-Event-ID':<28} missed {created}  received {len(ids)}  "
+              f"in order without duplicates: {in_order}  {(time.perf_counter() - started) * 1000:.0f} ms "
+              f"(buffer {order_feed._ids.maxlen})")
+        await resumed.close()
+
+        # Продолжение на воркере, который еще не прочитал последние события: Last-Event-ID впереди его ленты
+        async with AsyncSessionLocal() as db:
+            await db.execute(text(
+                "INSERT INTO order_events (order_id, type, payload) "
+                "SELECT order_id, type, payload FROM order_events ORDER BY id DESC LIMIT 10"
+            ))
+            await db.commit()
+            ahead_id = await db.scalar(text("SELECT max(id) FROM order_events"))
+        lagging = ahead_id - order_feed.last_id
+        ahead = Subscriber(app, ahead_id)
+        ahead.start()
+        await asyncio.sleep(0.1)
+        await client.post("/api/orders", json=make_order(0))
+        await wait_all([ahead], 1)
+        await asyncio.sleep(0.1)
+        ids = [event_id for _, event_id, _ in ahead.events]
+        print(f"{'resume ahead of worker feed':<28} worker behind by {lagging}  received {len(ids)}  "
+              f"no replayed events: {len(ids) == 1 and ids[0] > ahead_id}")
+        await ahead.close()
+        await order_feed.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--missed", type=int, default=2000, help="заказов, пропущенных при продолжении")
+    parser.add_argument("--buffer", type=int, default=1000, help="ORDER_STREAM_BUFFER")
+    parser.add_argument("--heartbeat", type=float, default=15)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["REDIS_URL"] = ""
+    os.environ["APP_WARMUP"] = "false"
+    os.environ["ORDER_STREAM_BUFFER"] = str(args.buffer)
+    os.environ["ORDER_STREAM_BACKEND"] = "memory"
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Всплеск одинаковых и разных чтений каталога: склейка запросов и лимиты по маршрутам.
+
+Сценарий hot - ссылку на продукт разослали в канал: --concurrency одновременных
+GET /api/products/{id} для одного id при холодном кэше, --rounds раз подряд.
+Сценарий cold - --cold-concurrency одновременных запросов к разным продуктам (склеивать нечего),
+с лимитами ROUTE_CONCURRENCY_LIMITS и без них.
+
+Для каждого режима печатаются запросы к БД, пик занятых соединений пула, p50/p99 и ответы 503.
+
+Запуск из каталога backend:
+    python benchmarks/product_burst.py --concurrency 1000 --cold-concurrency 2000 --rounds 3
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class PoolStats:
+    # Пик одновременно занятых соединений и число запросов к БД за прогон
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.checked_out = 0
+        self.peak = 0
+        self.queries = 0
+        event.listen(engine.pool, "checkout", self._checkout)
+        event.listen(engine.pool, "checkin", self._checkin)
+        event.listen(engine, "before_cursor_execute", self._query)
+
+    def _checkout(self, *args):
+        self.checked_out += 1
+        self.peak = max(self.peak, self.checked_out)
+
+    def _checkin(self, *args):
+        self.checked_out -= 1
+
+    def _query(self, *args):
+        self.queries += 1
+
+    def reset(self):
+        self.peak = self.checked_out
+        self.queries = 0
+
+async def burst(client, paths: list) -> tuple:
+    latencies = []
+    statuses = {}
+
+    async def send(path: str):
+        started = time.perf_counter()
+        try:
+            status = (await client.get(path)).status_code
+        except Exception:
+            status = "error"
+        latencies.append((time.perf_counter() - started) * 1000)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    await asyncio.gather(*(send(path) for path in paths))
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99) - 1], statuses
+
+async def run(concurrency: int, cold_concurrency: int, rounds: int, products: int):
+    import httpx
+    from sqlalchemy import insert
+    from admission import catalog_flight, route_limits
+    from cache import catalog_cache
+    from database import AsyncSessionLocal, async_engine, engine, run_migrations
+    from main import app
+    from models import Product
+    from seed import seed_products
+
+    run_migrations()
+    async with AsyncSessionLocal() as db:
+        await seed_products(db)
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [
+            {"name": f"Профнастил арт{i}", "description": "", "price_per_sqm": 500, "category": "Кровельные материалы",
+             "image_url": "", "specifications": "", "is_available": True}
+            for i in range(products)
+        ])
+
+    stats = PoolStats(async_engine.sync_engine)
+    limits = dict(route_limits)
+    scenarios = (
+        ("hot ", "no coalescing, no limits", False, False),
+        ("hot ", "coalescing,    no limits", True, False),
+        ("hot ", "coalescing,    limits   ", True, True),
+        ("cold", "no limits               ", True, False),
+        ("cold", "limits                  ", True, True),
+    )
+    async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=120) as client:
+        await app.router.startup()
+        for scenario, mode, coalescing, limited in scenarios:
+            catalog_flight.enabled = coalescing
+            route_limits.clear()
+            if limited:
+                route_limits.update(limits)
+            totals = {"queries": 0, "peak": 0, "p50": [], "p99": [], "statuses": {}}
+            for round_number in range(rounds):
+                await catalog_cache.invalidate()
+                stats.reset()
+                if scenario == "hot ":
+                    paths = ["/api/products/1"] * concurrency
+                else:
+                    first = 4 + round_number * cold_concurrency % max(products - cold_concurrency, 1)
+                    paths = [f"/api/products/{first + i}" for i in range(cold_concurrency)]
+                p50, p99, statuses = await burst(client, paths)
+                totals["queries"] += stats.queries
+                totals["peak"] = max(totals["peak"], stats.peak)
+                totals["p50"].append(p50)
+                totals["p99"].append(p99)
+                for status, count in statuses.items():
+                    totals["statuses"][status] = totals["statuses"].get(status, 0) + count
+            statuses = ", ".join(f"{status}: {count}" for status, count in sorted(totals["statuses"].items(), key=str))
+            print(
+                f"{scenario} {mode}  db queries/round {totals['queries'] / rounds:6.0f}  pool peak {totals['peak']:3}"
+                f"  p50 {sum(totals['p50']) / rounds:7.1f} ms  p99 {sum(totals['p99']) / rounds:7.1f} ms  [{statuses}]"
+            )
+        await app.router.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=1000)
+    parser.add_argument("--cold-concurrency", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--products", type=int, default=5000)
+    args = parser.parse_args()
+
+    # Отдельная временная SQLite-база и кэш в памяти процесса
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["REDIS_URL"] = ""
+    os.environ["APP_WARMUP"] = "false"
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+
+    asyncio.run(run(args.concurrency, args.cold_concurrency, args.rounds, args.products))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Задержка GET /api/products/search при росте каталога.
+
+Запуск из каталога backend:
+    python benchmarks/product_search.py --sizes 1000 10000 100000 --requests 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = ["профнастил", "металлочерепица", "сайдинг", "кровля", "фасад", "оцинковка", "полиэстер", "пурал", "матовый", "усиленный"]
+CATEGORIES = ["Кровельные материалы", "Фасадные материалы", "Водосточные системы", "Комплектующие"]
+QUERIES = [
+    {"q": "профнастил"},
+    {"q": "металлочерепица матовый"},
+    {"q": "сайдинг", "category": "Фасадные материалы"},
+    {"q": "полиэстер", "min_price": 300, "max_price": 600},
+    {"q": "усилен", "is_available": "true"},
+    {"q": "арт777"},
+]
+
+def make_product(i: int) -> dict:
+    rnd = random.Random(i)
+    words = rnd.sample(WORDS, 3)
+    return {
+        "name": f"{words[0].capitalize()} арт{i}",
+        "description": f"{words[1]} {words[2]} для частного и промышленного строительства",
+        "price_per_sqm": rnd.randint(200, 1200),
+        "category": rnd.choice(CATEGORIES),
+        "image_url": "",
+        "specifications": f"Толщина: 0.{rnd.randint(4, 7)}мм, Покрытие: {rnd.choice(WORDS)}",
+        "is_available": rnd.random() > 0.1,
+    }
+
+def grow_catalog(engine, current: int, target: int):
+    from sqlalchemy import insert
+    from models import Product
+
+    with engine.begin() as conn:
+        for offset in range(current, target, 5000):
+            rows = [make_product(i) for i in range(offset, min(offset + 5000, target))]
+            conn.execute(insert(Product), rows)
+
+async def measure(client, requests: int):
+    latencies = []
+    for i in range(requests):
+        started = time.perf_counter()
+        response = await client.get("/api/products/search", params=QUERIES[i % len(QUERIES)])
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+async def run(sizes, requests: int):
+    import httpx
+    from database import engine, run_migrations
+    from main import app
+
+    run_migrations()
+
+    current = 0
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        for size in sorted(sizes):
+            grow_catalog(engine, current, size)
+            current = size
+            p50, p95 = await measure(client, requests)
+            print(f"products: {size:>7}  p50: {p50:6.2f} ms  p95: {p95:6.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    # Отдельная временная SQLite-база, чтобы не трогать рабочую
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+
+    asyncio.run(run(args.sizes, args.requests))
+
+if __name__ == "__main__":
+    main()
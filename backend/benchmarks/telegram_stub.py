@@ -0,0 +1,71 @@
+"""Локальная заглушка Telegram Bot API (sendMessage) с лимитами, 429 и заблокированными чатами.
+
+Используется бенчмарком рассылки и для ручной проверки broadcast.py:
+    python benchmarks/telegram_stub.py --port 8081 --rate 30 --blocked-every 20
+    TELEGRAM_API_URL=http://127.0.0.1:8081 TELEGRAM_BOT_TOKEN=test python broadcast.py send "Проверка"
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter, deque
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+class TelegramStub:
+    # rate - сообщений в секунду на бота (0 - без лимита); в один чат - не чаще раза в секунду, как в Telegram
+    def __init__(self, rate: float = 30, latency: float = 0.05, blocked_every: int = 0, retry_after: int = 1):
+        self.rate = rate
+        self.latency = latency
+        self.blocked_every = blocked_every
+        self.retry_after = retry_after
+        self.delivered = Counter()
+        self.rate_limited = 0
+        self.messages = 0
+        self._window = deque()
+        self._last_by_chat = {}
+        self.app = Starlette(routes=[Route("/bot{token}/sendMessage", self.send_message, methods=["POST"])])
+
+    def _error(self, code: int, description: str, **parameters) -> JSONResponse:
+        body = {"ok": False, "error_code": code, "description": description}
+        if parameters:
+            body["parameters"] = parameters
+        return JSONResponse(body, status_code=code)
+
+    def _too_many(self, now: float, chat_id: int) -> bool:
+        while self._window and self._window[0] <= now - 1:
+            self._window.popleft()
+        if self.rate and len(self._window) >= self.rate:
+            return True
+        return now - self._last_by_chat.get(chat_id, float("-inf")) < 1
+
+    async def send_message(self, request: Request):
+        payload = await request.json()
+        chat_id = int(payload["chat_id"])
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        now = time.monotonic()
+        if self.blocked_every and chat_id % self.blocked_every == 0:
+            return self._error(403, "Forbidden: bot was blocked by the user")
+        if self._too_many(now, chat_id):
+            self.rate_limited += 1
+            return self._error(429, f"Too Many Requests: retry after {self.retry_after}", retry_after=self.retry_after)
+        self._window.append(now)
+        self._last_by_chat[chat_id] = now
+        self.delivered[chat_id] += 1
+        self.messages += 1
+        return JSONResponse({"ok": True, "result": {"message_id": self.messages, "chat": {"id": chat_id},
+                                                    "text": payload.get("text", "")}})
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--rate", type=float, default=30)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--blocked-every", type=int, default=0, help="каждый N-й chat_id заблокировал бота")
+    args = parser.parse_args()
+    stub = TelegramStub(args.rate, args.latency, args.blocked_every)
+    uvicorn.run(stub.app, host="127.0.0.1", port=args.port)
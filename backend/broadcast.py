@@ -0,0 +1,348 @@
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import httpx
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database import DATABASE_URL, AsyncSessionLocal
+from models import Broadcast, TelegramUser
+
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
+# Адрес Bot API; для проверки рассылки подставляется локальная заглушка (см. benchmarks/broadcast.py)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+# Telegram пропускает около 30 сообщений в секунду от одного бота - держим темп с запасом
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+# Отправок в полете одновременно: Bot API отвечает за ~100 мс, темп задает BROADCAST_RATE
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "50"))
+# Получателей между контрольными точками; после прерывания не более стольких получат сообщение повторно
+BROADCAST_CHUNK_SIZE = int(os.getenv("BROADCAST_CHUNK_SIZE", "500"))
+BROADCAST_MAX_ATTEMPTS = int(os.getenv("BROADCAST_MAX_ATTEMPTS", "5"))
+# Пауза перед повтором после сетевой ошибки или 5xx, удваивается с каждой попыткой
+BROADCAST_RETRY_BACKOFF = float(os.getenv("BROADCAST_RETRY_BACKOFF", "1"))
+# Рассылку ведет один процесс: он продлевает аренду каждые BROADCAST_LEASE_SECONDS / 3 секунд.
+# Рассылку упавшего процесса можно продолжить, когда его аренда истекла
+BROADCAST_LEASE_SECONDS = float(os.getenv("BROADCAST_LEASE_SECONDS", "60"))
+
+# Не чаще одного сообщения в секунду в один чат, в том числе при повторах
+PER_CHAT_INTERVAL = 1.0
+# Сколько ответов 429 подряд терпим для одного получателя
+MAX_RATE_LIMITED = 20
+# Описания ошибок, после которых писать пользователю бессмысленно
+BLOCKED_ERRORS = ("blocked by the user", "user is deactivated", "chat not found", "bot was kicked", "PEER_ID_INVALID")
+
+SENT, BLOCKED, FAILED = "sent", "blocked", "failed"
+
+logger = logging.getLogger(__name__)
+
+class TelegramError(Exception):
+    def __init__(self, status_code: int, description: str, retry_after: Optional[float] = None):
+        super().__init__(f"{status_code}: {description}")
+        self.status_code = status_code
+        self.description = description
+        self.retry_after = retry_after
+
+class BroadcastBusy(Exception):
+    # Рассылку ведет другой процесс (или он перехватил ее, пока этот не продлил аренду)
+    pass
+
+class BotApi:
+    # Минимальный клиент Bot API для рассылки; transport подменяется в бенчмарке заглушкой
+    def __init__(self, token: str = TELEGRAM_BOT_TOKEN, api_url: str = TELEGRAM_API_URL,
+                 max_connections: int = BROADCAST_CONCURRENCY, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._client = httpx.AsyncClient(
+            base_url=f"{api_url}/bot{token}/",
+            timeout=httpx.Timeout(30, connect=5),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+
+    async def send_message(self, chat_id: int, text: str, parse_mode: Optional[str] = None) -> dict:
+        payload = {"chat_id": chat_id, "text": text}
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
+        response = await self._client.post("sendMessage", json=payload)
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        if data.get("ok"):
+            return data["result"]
+        parameters = data.get("parameters") or {}
+        raise TelegramError(response.status_code, data.get("description", response.reason_phrase), parameters.get("retry_after"))
+
+    async def close(self):
+        await self._client.aclose()
+
+class RateLimiter:
+    # Равномерный темп: каждый acquire получает свой слот; pause() после 429 сдвигает все отправки
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._paused_until = 0.0
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+            if slot > now:
+                await asyncio.sleep(slot - now)
+            if time.monotonic() >= self._paused_until:
+                return
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+async def deliver(api: BotApi, limiter: RateLimiter, chat_id: int, text: str, parse_mode: Optional[str] = None) -> str:
+    attempts = 0
+    rate_limited = 0
+    while True:
+        await limiter.acquire()
+        sent_at = time.monotonic()
+        try:
+            await api.send_message(chat_id, text, parse_mode)
+            return SENT
+        except TelegramError as e:
+            if e.status_code == 429 and rate_limited < MAX_RATE_LIMITED:
+                # Флуд-контроль Telegram действует на весь бот: останавливаем все отправки, а не только эту
+                rate_limited += 1
+                limiter.pause(e.retry_after or PER_CHAT_INTERVAL)
+                await asyncio.sleep(max(sent_at + PER_CHAT_INTERVAL - time.monotonic(), 0))
+                continue
+            if e.status_code == 403 or any(marker in e.description for marker in BLOCKED_ERRORS):
+                return BLOCKED
+            if e.status_code < 500:
+                logger.warning("Broadcast message to %s rejected: %s", chat_id, e)
+                return FAILED
+            error = e
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            # Запрос не ушел в Telegram - повтор не приведет к дублю
+            error = e
+        except httpx.TransportError as e:
+            # Сообщение могло дойти; повтор рискует дублем, поэтому считаем ошибкой
+            logger.warning("Broadcast message to %s failed: %r", chat_id, e)
+            return FAILED
+        attempts += 1
+        if attempts >= BROADCAST_MAX_ATTEMPTS:
+            logger.warning("Broadcast message to %s failed after %s attempts: %r", chat_id, attempts, error)
+            return FAILED
+        delay = BROADCAST_RETRY_BACKOFF * 2 ** (attempts - 1)
+        await asyncio.sleep(max(delay, sent_at + PER_CHAT_INTERVAL - time.monotonic()))
+
+async def register_user(db, user: dict) -> TelegramUser:
+    # /start: новый пользователь добавляется, вернувшийся (в том числе блокировавший бота) снова активен
+    insert_fn = sqlite_insert if DATABASE_URL.startswith("sqlite") else pg_insert
+    stmt = insert_fn(TelegramUser).values(**user, is_active=True)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["telegram_id"],
+        set_={
+            "username": stmt.excluded.username,
+            "first_name": stmt.excluded.first_name,
+            "last_name": stmt.excluded.last_name,
+            "is_active": True,
+        },
+    )
+    result = await db.scalars(stmt.returning(TelegramUser), execution_options={"populate_existing": True})
+    telegram_user = result.one()
+    await db.commit()
+    return telegram_user
+
+async def create_broadcast(text: str, parse_mode: Optional[str] = None) -> int:
+    async with AsyncSessionLocal() as db:
+        broadcast = Broadcast(text=text, parse_mode=parse_mode, status="pending", last_user_id=0,
+                              sent=0, blocked=0, failed=0)
+        db.add(broadcast)
+        await db.commit()
+        return broadcast.id
+
+def _claimable(now: datetime):
+    # Новая рассылка или начатая процессом, который перестал продлевать аренду
+    return or_(
+        Broadcast.status == "pending",
+        and_(Broadcast.status == "running",
+             or_(Broadcast.lease_expires_at.is_(None), Broadcast.lease_expires_at < now)),
+    )
+
+async def claim_broadcast(broadcast_id: int, owner: str, lease: float = BROADCAST_LEASE_SECONDS) -> bool:
+    # Compare-and-set: из нескольких процессов рассылку получает ровно один
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(Broadcast).where(Broadcast.id == broadcast_id, _claimable(now)).values(
+                status="running",
+                lease_owner=owner,
+                lease_expires_at=now + timedelta(seconds=lease),
+                started_at=func.coalesce(Broadcast.started_at, now),
+            )
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+async def renew_lease(broadcast_id: int, owner: str, lease: float = BROADCAST_LEASE_SECONDS) -> bool:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(Broadcast).where(Broadcast.id == broadcast_id, Broadcast.lease_owner == owner,
+                                    Broadcast.status == "running")
+            .values(lease_expires_at=datetime.now(timezone.utc) + timedelta(seconds=lease))
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+async def release_lease(broadcast_id: int, owner: str):
+    # Процесс жив, но рассылку не закончил (отмена, ошибка): ее можно продолжить сразу
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(Broadcast).where(Broadcast.id == broadcast_id, Broadcast.lease_owner == owner,
+                                    Broadcast.status == "running")
+            .values(lease_owner=None, lease_expires_at=None)
+        )
+        await db.commit()
+
+async def _keep_lease(broadcast_id: int, owner: str, lease: float, lost: asyncio.Event):
+    while True:
+        await asyncio.sleep(lease / 3)
+        try:
+            renewed = await renew_lease(broadcast_id, owner, lease)
+        except Exception as e:
+            # Продлить не удалось - пробуем снова; аренду за нами сохраняет запас в две трети срока
+            logger.warning("Broadcast %s: lease renewal failed: %r", broadcast_id, e)
+            continue
+        if not renewed:
+            lost.set()
+            return
+
+async def run_broadcast(broadcast_id: int, api: Optional[BotApi] = None, rate: float = BROADCAST_RATE,
+                        concurrency: int = BROADCAST_CONCURRENCY, chunk_size: int = BROADCAST_CHUNK_SIZE,
+                        lease: float = BROADCAST_LEASE_SECONDS) -> Broadcast:
+    # Получатели идут по возрастанию TelegramUser.id; после каждой пачки в той же транзакции
+    # сохраняются счетчики, отключенные пользователи и last_user_id - с него рассылка и продолжится
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    if not await claim_broadcast(broadcast_id, owner, lease):
+        async with AsyncSessionLocal() as db:
+            broadcast = await db.get(Broadcast, broadcast_id)
+        if broadcast is None:
+            raise LookupError(f"Broadcast {broadcast_id} not found")
+        if broadcast.status == "done":
+            return broadcast
+        raise BroadcastBusy(f"Broadcast {broadcast_id} is running in {broadcast.lease_owner} "
+                            f"until {broadcast.lease_expires_at}")
+    async with AsyncSessionLocal() as db:
+        broadcast = await db.get(Broadcast, broadcast_id)
+    text, parse_mode, last_user_id = broadcast.text, broadcast.parse_mode, broadcast.last_user_id
+
+    own_api = api is None
+    api = api or BotApi(max_connections=concurrency)
+    limiter = RateLimiter(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+    lost = asyncio.Event()
+    keeper = asyncio.create_task(_keep_lease(broadcast_id, owner, lease, lost))
+    finished = False
+
+    async def send(chat_id: int) -> str:
+        async with semaphore:
+            return await deliver(api, limiter, chat_id, text, parse_mode)
+
+    try:
+        while True:
+            if lost.is_set():
+                raise BroadcastBusy(f"Broadcast {broadcast_id}: lease lost")
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(TelegramUser.id, TelegramUser.telegram_id)
+                    .where(TelegramUser.is_active.is_(True), TelegramUser.id > last_user_id)
+                    .order_by(TelegramUser.id)
+                    .limit(chunk_size)
+                )
+                recipients = result.all()
+            if not recipients:
+                break
+            outcomes = await asyncio.gather(*(send(telegram_id) for _, telegram_id in recipients))
+            blocked_ids = [user_id for (user_id, _), outcome in zip(recipients, outcomes) if outcome == BLOCKED]
+            last_user_id = recipients[-1].id
+
+            async with AsyncSessionLocal() as db:
+                # Контрольная точка пишется, только пока аренда за этим процессом
+                checkpoint = await db.execute(
+                    update(Broadcast).where(Broadcast.id == broadcast_id, Broadcast.lease_owner == owner).values(
+                        last_user_id=last_user_id,
+                        sent=Broadcast.sent + outcomes.count(SENT),
+                        blocked=Broadcast.blocked + len(blocked_ids),
+                        failed=Broadcast.failed + outcomes.count(FAILED),
+                        lease_expires_at=datetime.now(timezone.utc) + timedelta(seconds=lease),
+                    )
+                )
+                if checkpoint.rowcount != 1:
+                    raise BroadcastBusy(f"Broadcast {broadcast_id}: lease lost")
+                if blocked_ids:
+                    await db.execute(update(TelegramUser).where(TelegramUser.id.in_(blocked_ids)).values(is_active=False))
+                await db.commit()
+            logger.info("Broadcast %s: checkpoint at user %s", broadcast_id, last_user_id)
+
+        async with AsyncSessionLocal() as db:
+            done = await db.execute(
+                update(Broadcast).where(Broadcast.id == broadcast_id, Broadcast.lease_owner == owner).values(
+                    status="done", finished_at=datetime.now(timezone.utc), lease_owner=None, lease_expires_at=None,
+                )
+            )
+            if done.rowcount != 1:
+                raise BroadcastBusy(f"Broadcast {broadcast_id}: lease lost")
+            await db.commit()
+            broadcast = await db.get(Broadcast, broadcast_id)
+        finished = True
+    finally:
+        keeper.cancel()
+        if own_api:
+            await api.close()
+        if not finished and not lost.is_set():
+            await release_lease(broadcast_id, owner)
+
+    logger.info("Broadcast %s done: sent %s, blocked %s, failed %s",
+                broadcast_id, broadcast.sent, broadcast.blocked, broadcast.failed)
+    return broadcast
+
+async def unfinished_broadcasts() -> list:
+    # Рассылки, которые сейчас ведет живой процесс, не трогаем
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(Broadcast.id).where(_claimable(datetime.now(timezone.utc))).order_by(Broadcast.id)
+        )
+        return result.scalars().all()
+
+async def _send(text: str, parse_mode: Optional[str]):
+    await run_broadcast(await create_broadcast(text, parse_mode))
+
+async def _resume(broadcast_id: Optional[int]):
+    # Без id продолжаются все незавершенные рассылки по очереди
+    for unfinished_id in [broadcast_id] if broadcast_id else await unfinished_broadcasts():
+        try:
+            await run_broadcast(unfinished_id)
+        except BroadcastBusy as e:
+            logger.warning("%s", e)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Telegram broadcast to all active bot users")
+    commands = parser.add_subparsers(dest="command", required=True)
+    send_parser = commands.add_parser("send", help="создать рассылку и отправить")
+    send_parser.add_argument("text")
+    send_parser.add_argument("--parse-mode", choices=["HTML", "MarkdownV2"])
+    resume_parser = commands.add_parser("resume", help="продолжить прерванную рассылку с контрольной точки")
+    resume_parser.add_argument("broadcast_id", type=int, nargs="?")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # httpx пишет в INFO полный URL запроса, а в нем токен бота
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if args.command == "send":
+        asyncio.run(_send(args.text, args.parse_mode))
+    else:
+        asyncio.run(_resume(args.broadcast_id))
@@ -0,0 +1,205 @@
+import base64
+import gzip
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+from fastapi import Request, Response
+import orjson
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него отдаем только gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", "300"))
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "1024"))
+# Ответы меньше этого размера не сжимаются
+CATALOG_COMPRESS_MIN_BYTES = int(os.getenv("CATALOG_COMPRESS_MIN_BYTES", "1024"))
+
+# Записи кэша - словари {"body", "encodings", "etag", "last_modified", "headers"}, одинаковые для обоих бэкендов;
+# body - уже закодированный JSON, encodings - его сжатые варианты {"br": ..., "gzip": ...}
+
+class MemoryCache:
+    # Ограниченный LRU с TTL внутри процесса (используется, если Redis не настроен)
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation = 0
+        self._entries = OrderedDict()
+
+    async def get(self, key: str) -> Optional[dict]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def lookup(self, key: str) -> tuple:
+        # -> (запись или None, поколение кэша для последующего set)
+        return await self.get(key), self.generation
+
+    async def set(self, key: str, value: dict, generation: Optional[int] = None):
+        if generation is not None and generation != self.generation:
+            # Кэш сбросили, пока запись строилась: в ней могут быть данные до изменения
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: str):
+        self._entries.pop(key, None)
+
+    async def invalidate(self):
+        self.generation += 1
+        self._entries.clear()
+
+# Версия и запись одним запросом к Redis
+LOOKUP_SCRIPT = """
+local generation = redis.call('GET', KEYS[1]) or '0'
+return {generation, redis.call('GET', ARGV[1] .. generation .. ':' .. ARGV[2])}
+"""
+
+class RedisCache:
+    # Каждая запись - свой ключ {namespace}:{версия}:{key} со своим TTL. Инвалидация - INCR версии:
+    # записи старой версии больше не читаются и истекают сами, а загрузка, начатая до инвалидации,
+    # пишет в старую версию и не может вернуть устаревшие данные
+    def __init__(self, url: str, ttl: int, namespace: str = "catalog"):
+        self.client = redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = f"{namespace}:"
+        self.version_key = f"{namespace}:version"
+        self._lookup = self.client.register_script(LOOKUP_SCRIPT)
+
+    async def lookup(self, key: str) -> tuple:
+        try:
+            generation, raw = await self._lookup(keys=[self.version_key], args=[self.prefix, key])
+        except RedisError as e:
+            logger.warning("Catalog cache read failed: %s", e)
+            return None, None
+        if raw is None:
+            return None, int(generation)
+        value = orjson.loads(raw)
+        # Байтовые поля хранятся в base64, так как JSON не умеет bytes
+        value["body"] = base64.b64decode(value["body"])
+        value["encodings"] = {name: base64.b64decode(data) for name, data in value["encodings"].items()}
+        return value, int(generation)
+
+    async def get(self, key: str) -> Optional[dict]:
+        value, _ = await self.lookup(key)
+        return value
+
+    async def set(self, key: str, value: dict, generation: Optional[int] = None):
+        raw = orjson.dumps(dict(
+            value,
+            body=base64.b64encode(value["body"]).decode(),
+            encodings={name: base64.b64encode(data).decode() for name, data in value["encodings"].items()},
+        ))
+        try:
+            if generation is None:
+                generation = int(await self.client.get(self.version_key) or 0)
+            await self.client.set(f"{self.prefix}{generation}:{key}", raw, ex=self.ttl)
+        except RedisError as e:
+            logger.warning("Catalog cache write failed: %s", e)
+
+    async def invalidate(self):
+        try:
+            await self.client.incr(self.version_key)
+        except RedisError as e:
+            logger.warning("Catalog cache invalidation failed: %s", e)
+
+def create_cache():
+    if REDIS_URL:
+        return RedisCache(REDIS_URL, CATALOG_CACHE_TTL)
+    return MemoryCache(CATALOG_CACHE_MAX_ENTRIES, CATALOG_CACHE_TTL)
+
+catalog_cache = create_cache()
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite возвращает naive datetime, CURRENT_TIMESTAMP там всегда в UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def product_modified_at(product) -> datetime:
+    return _as_utc(product.updated_at or product.created_at)
+
+def _compress(body: bytes) -> dict:
+    # Сжимаем один раз при построении записи, а не на каждый запрос
+    if len(body) < CATALOG_COMPRESS_MIN_BYTES:
+        return {}
+    encodings = {"gzip": gzip.compress(body, compresslevel=6, mtime=0)}
+    if brotli is not None:
+        encodings["br"] = brotli.compress(body, quality=5)
+    return encodings
+
+def build_entry(body, products, headers: Optional[dict] = None, variant: str = "") -> dict:
+    # ETag и Last-Modified считаются по (id, updated_at) продуктов, а не по телу ответа;
+    # variant различает представления одних и тех же продуктов (например, набор полей)
+    stamps = [(product.id, product_modified_at(product)) for product in products]
+    fingerprint = variant + ";" + ";".join(f"{product_id}:{stamp.isoformat()}" for product_id, stamp in stamps)
+    last_modified = max((stamp for _, stamp in stamps), default=None)
+    encoded = orjson.dumps(body)
+    return {
+        "body": encoded,
+        "encodings": _compress(encoded),
+        "etag": '"%s"' % hashlib.sha1(fingerprint.encode()).hexdigest(),
+        "last_modified": format_datetime(last_modified, usegmt=True) if last_modified else None,
+        "headers": headers or {},
+    }
+
+def _is_not_modified(request: Request, entry: dict) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or entry["etag"] in tags or f"W/{entry['etag']}" in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and entry["last_modified"]:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return parsedate_to_datetime(entry["last_modified"]) <= since
+    return False
+
+def _accepted_encodings(request: Request) -> set:
+    accepted = set()
+    for item in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+def cached_response(request: Request, entry: dict) -> Response:
+    headers = dict(entry["headers"], ETag=entry["etag"])
+    headers["Cache-Control"] = "no-cache"
+    if entry["last_modified"]:
+        headers["Last-Modified"] = entry["last_modified"]
+    if entry["encodings"]:
+        headers["Vary"] = "Accept-Encoding"
+
+    if _is_not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+
+    accepted = _accepted_encodings(request)
+    for encoding in ("br", "gzip"):
+        if encoding in entry["encodings"] and (encoding in accepted or "*" in accepted):
+            headers["Content-Encoding"] = encoding
+            return Response(content=entry["encodings"][encoding], media_type="application/json", headers=headers)
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
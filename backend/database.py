@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -9,10 +10,64 @@ load_dotenv()
 # Database URL - можно использовать PostgreSQL или SQLite для разработки
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./triformstack.db")
 
+# Параметры пула соединений (для PostgreSQL), чтобы можно было замерять конкурентность на воркер
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+
+
+def get_async_database_url(url: str) -> str:
+    # Подставляем асинхронный драйвер: asyncpg для PostgreSQL, aiosqlite для SQLite
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql+psycopg2:"):
+        return url.replace("postgresql+psycopg2:", "postgresql+asyncpg:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    if url.startswith("postgres:"):
+        return url.replace("postgres:", "postgresql+asyncpg:", 1)
+    return url
+
+
+ASYNC_DATABASE_URL = get_async_database_url(DATABASE_URL)
+
+# Синхронный движок остается для DDL и служебных скриптов
 if DATABASE_URL.startswith("sqlite"):
     engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 else:
     engine = create_engine(DATABASE_URL)
 
+# Асинхронный движок - основной путь для запросов из API
+if ASYNC_DATABASE_URL.startswith("sqlite"):
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=DB_ECHO)
+else:
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        echo=DB_ECHO,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+    )
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+Base = declarative_base()
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def run_migrations(revision: str = "head"):
+    # То же, что `alembic upgrade head` из каталога backend; нужно скриптам и бенчмаркам на временных базах
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "migrations"))
+    config.attributes["configure_logger"] = False
+    command.upgrade(config, revision)
@@ -0,0 +1,78 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select
+from database import AsyncSessionLocal
+from models import Order
+from pagination import created_at_bound
+
+EXPORT_COLUMNS = [
+    "id", "created_at", "customer_name", "customer_email", "customer_phone", "product_id",
+    "quantity_sqm", "total_price", "status", "source", "message", "user_id",
+]
+# Сколько строк забирается из серверного курсора за раз
+EXPORT_BATCH_SIZE = 1000
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+def build_export_query(
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    status: Optional[str] = None,
+    source: Optional[str] = None,
+):
+    # Только колонки таблицы, без ORM-объектов: строки сразу уходят в поток
+    query = select(*(Order.__table__.c[name] for name in EXPORT_COLUMNS))
+    if date_from:
+        query = query.where(Order.created_at >= created_at_bound(date_from))
+    if date_to:
+        query = query.where(Order.created_at < created_at_bound(date_to))
+    if status:
+        query = query.where(Order.status == status)
+    if source:
+        query = query.where(Order.source == source)
+    return query.order_by(Order.created_at, Order.id)
+
+def _format_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _encode_csv(rows, header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows([_format_value(value) for value in row] for row in rows)
+    return buffer.getvalue().encode()
+
+def _encode_ndjson(rows) -> bytes:
+    lines = (
+        json.dumps({name: _format_value(value) for name, value in zip(EXPORT_COLUMNS, row)}, ensure_ascii=False)
+        for row in rows
+    )
+    return "".join(line + "\n" for line in lines).encode()
+
+async def stream_orders(query, export_format: str, compress: bool = False):
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def emit(chunk: bytes) -> bytes:
+        if compressor is None:
+            return chunk
+        return compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    if export_format == "csv":
+        yield emit(_encode_csv([], header=True))
+
+    # Своя сессия: она должна жить ровно столько, сколько отдается ответ
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            if export_format == "csv":
+                yield emit(_encode_csv(rows))
+            else:
+                yield emit(_encode_ndjson(rows))
+
+    if compressor is not None:
+        yield compressor.flush()
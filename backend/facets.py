@@ -0,0 +1,103 @@
+import argparse
+import asyncio
+from collections import Counter
+from sqlalchemy import delete, event, func, inspect, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.base import NO_VALUE
+from attributes import ATTRIBUTE_TYPES
+from database import DATABASE_URL, AsyncSessionLocal
+from models import Product, ProductFacet
+
+# Фасеты каталога: категория продукта и атрибуты из Product.attributes
+FACETS = ("category", "thickness_mm", "coating")
+
+def facet_values(category, attributes) -> Counter:
+    # Пары (фасет, значение строкой), в которые попадает продукт
+    values = Counter()
+    if category:
+        values["category", category] += 1
+    for name in FACETS[1:]:
+        value = (attributes or {}).get(name)
+        if value is not None:
+            values[name, f"{value:g}" if isinstance(value, float) else str(value)] += 1
+    return values
+
+def _upsert_statement():
+    insert_fn = sqlite_insert if DATABASE_URL.startswith("sqlite") else pg_insert
+    stmt = insert_fn(ProductFacet)
+    return stmt.on_conflict_do_update(
+        index_elements=["facet", "value"],
+        set_={"count": ProductFacet.count + stmt.excluded.count},
+    )
+
+def _loaded(state, name):
+    # Значение до изменения в этом flush; None, если оно не было загружено
+    history = state.attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    value = state.attrs[name].loaded_value
+    return None if value is NO_VALUE else value
+
+@event.listens_for(Session, "after_flush")
+def _record_product_changes(session, flush_context):
+    # Счетчики меняются в той же транзакции, что и продукты: фасеты не пересчитываются сканом каталога.
+    # Изменения мимо ORM (bulk insert/update) счетчики не видят - для них `python facets.py rebuild`
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, Product):
+            deltas.update(facet_values(obj.category, obj.attributes))
+    for obj in session.dirty:
+        if isinstance(obj, Product):
+            state = inspect(obj)
+            if state.attrs.category.history.has_changes() or state.attrs.attributes.history.has_changes():
+                deltas.subtract(facet_values(_loaded(state, "category"), _loaded(state, "attributes")))
+                deltas.update(facet_values(obj.category, obj.attributes))
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            state = inspect(obj)
+            deltas.subtract(facet_values(_loaded(state, "category"), _loaded(state, "attributes")))
+    rows = [{"facet": facet, "value": value, "count": count} for (facet, value), count in deltas.items() if count]
+    if rows:
+        session.connection().execute(_upsert_statement(), rows)
+
+async def load_facets(db) -> dict:
+    # {"category": [{"value": "Профнастил", "count": 12}, ...], "thickness_mm": [{"value": 0.5, ...}], ...}
+    result = await db.execute(
+        select(ProductFacet.facet, ProductFacet.value, ProductFacet.count)
+        .where(ProductFacet.count > 0)
+        .order_by(ProductFacet.facet, ProductFacet.count.desc(), ProductFacet.value)
+    )
+    facets = {name: [] for name in FACETS}
+    for facet, value, count in result:
+        if facet in facets:
+            facets[facet].append({"value": ATTRIBUTE_TYPES.get(facet, str)(value), "count": count})
+    return facets
+
+async def rebuild_facets(db):
+    # Полный пересчет счетчиков по каталогу
+    counts = Counter()
+    result = await db.stream(select(Product.category, Product.attributes))
+    async for category, attributes in result:
+        counts.update(facet_values(category, attributes))
+    await db.execute(delete(ProductFacet))
+    if counts:
+        await db.execute(
+            insert(ProductFacet),
+            [{"facet": facet, "value": value, "count": count} for (facet, value), count in counts.items()],
+        )
+
+async def _rebuild():
+    async with AsyncSessionLocal() as db:
+        await rebuild_facets(db)
+        await db.commit()
+        count = await db.scalar(select(func.count(ProductFacet.id)))
+    print(f"✅ Счетчики фасетов пересчитаны: {count} значений")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Catalog facet counters")
+    parser.add_argument("command", choices=["rebuild"])
+    args = parser.parse_args()
+    if args.command == "rebuild":
+        asyncio.run(_rebuild())
@@ -0,0 +1,309 @@
+import asyncio
+import logging
+import os
+from bisect import bisect_right
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional
+import orjson
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.engine import make_url
+from database import ASYNC_DATABASE_URL, DATABASE_URL, AsyncSessionLocal
+from models import OrderEvent
+from schemas import OrderResponse
+
+# Откуда воркер узнает о новых событиях: postgres (LISTEN/NOTIFY), redis (pub/sub), memory (только
+# коммиты этого процесса); auto - postgres для PostgreSQL, иначе redis при REDIS_URL, иначе memory
+ORDER_STREAM_BACKEND = os.getenv("ORDER_STREAM_BACKEND", "auto")
+# Пустой комментарий подписчикам раз в столько секунд, чтобы прокси не закрывали соединение;
+# заодно лента перечитывает новые события, если уведомление потерялось
+ORDER_STREAM_HEARTBEAT = float(os.getenv("ORDER_STREAM_HEARTBEAT", "15"))
+# Последние события в памяти воркера: переподключение с Last-Event-ID в их пределах не идет в БД
+ORDER_STREAM_BUFFER = int(os.getenv("ORDER_STREAM_BUFFER", "1000"))
+ORDER_STREAM_MAX_SUBSCRIBERS = int(os.getenv("ORDER_STREAM_MAX_SUBSCRIBERS", "10000"))
+# Сколько хранятся события в order_events; клиент, отставший сильнее, получает событие reset.
+# Старые события удаляет воркер outbox.py раз в ORDER_EVENTS_PRUNE_INTERVAL секунд
+ORDER_EVENTS_RETENTION_HOURS = float(os.getenv("ORDER_EVENTS_RETENTION_HOURS", "72"))
+ORDER_EVENTS_PRUNE_INTERVAL = 3600
+REDIS_URL = os.getenv("REDIS_URL")
+
+CHANNEL = "order_events"
+# Ключ advisory-блокировки PostgreSQL: транзакции с событиями коммитятся в порядке их id
+EVENTS_LOCK_KEY = 7_301_022
+# Пауза перед переподключением к LISTEN/pub-sub
+RECONNECT_DELAY = 5
+DB_PAGE_SIZE = 500
+# Через сколько миллисекунд EventSource переподключается после обрыва
+RETRY_MS = 3000
+
+ORDER_CREATED = "order.created"
+ORDER_STATUS_CHANGED = "order.status_changed"
+
+logger = logging.getLogger(__name__)
+
+def _backend() -> str:
+    if ORDER_STREAM_BACKEND != "auto":
+        return ORDER_STREAM_BACKEND
+    if not DATABASE_URL.startswith("sqlite"):
+        return "postgres"
+    return "redis" if REDIS_URL else "memory"
+
+BACKEND = _backend()
+
+def event_payload(order, old_status: Optional[str] = None) -> str:
+    # order - строка Order или словарь из insert_orders
+    payload = {"order": OrderResponse.model_validate(order).model_dump(mode="json")}
+    if old_status is not None:
+        payload["old_status"] = old_status
+    return orjson.dumps(payload).decode()
+
+async def record_order_events(db, event_type: str, orders: list, old_status: Optional[str] = None):
+    # Вызывается последним в транзакции, которая меняет заказы: событие видно подписчикам только после коммита
+    if not orders:
+        return
+    if BACKEND == "postgres":
+        # Иначе транзакция с меньшим id могла бы закоммититься позже большей и лента ее пропустила бы;
+        # блокировка держится только до коммита
+        await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": EVENTS_LOCK_KEY})
+    await db.execute(insert(OrderEvent), [
+        {"order_id": _order_id(order), "type": event_type, "payload": event_payload(order, old_status)}
+        for order in orders
+    ])
+    if BACKEND == "postgres":
+        # NOTIFY доставляется слушателям в момент коммита
+        await db.execute(text("SELECT pg_notify(:channel, '')"), {"channel": CHANNEL})
+
+def _order_id(order) -> int:
+    return order["id"] if isinstance(order, dict) else order.id
+
+def notify():
+    # Вызывается после коммита заказов: будит ленту этого процесса, с Redis - и остальных воркеров
+    order_feed.wake()
+    if BACKEND == "redis":
+        task = asyncio.get_running_loop().create_task(order_feed.publish())
+        _publishing.add(task)
+        task.add_done_callback(_publishing.discard)
+
+_publishing = set()
+
+def _frame(event_id: int, event_type: str, payload: str) -> bytes:
+    return f"id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n".encode()
+
+class OrderFeed:
+    # Один читатель order_events на воркер: при уведомлении новые события читаются из БД один раз,
+    # складываются в кольцевой буфер уже закодированными и раздаются всем подписчикам.
+    # Подписчик в простое - это корутина, ждущая общий asyncio.Event: ни соединения с БД, ни таймера
+    def __init__(self, buffer_size: int = ORDER_STREAM_BUFFER, heartbeat: float = ORDER_STREAM_HEARTBEAT):
+        self.heartbeat = heartbeat
+        self.subscribers = 0
+        self.started = False
+        self.last_id = 0
+        self._ids = deque(maxlen=buffer_size)
+        self._frames = deque(maxlen=buffer_size)
+        # События с id > _floor есть в буфере целиком
+        self._floor = 0
+        self._changed: Optional[asyncio.Event] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._fetching: Optional[asyncio.Task] = None
+        self._fetch_again = False
+        self._tasks: list = []
+        self._redis = None
+        self._closed = False
+
+    async def start(self):
+        # Запускается первым подписчиком: воркеры без подписчиков не держат LISTEN и не опрашивают БД
+        if self.started:
+            return
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self.started:
+                return
+            async with AsyncSessionLocal() as db:
+                self.last_id = self._floor = await db.scalar(select(func.coalesce(func.max(OrderEvent.id), 0)))
+            self._changed = asyncio.Event()
+            self._tasks.append(asyncio.create_task(self._tick()))
+            if BACKEND == "postgres":
+                self._tasks.append(asyncio.create_task(self._listen_postgres()))
+            elif BACKEND == "redis":
+                self._tasks.append(asyncio.create_task(self._listen_redis()))
+            self.started = True
+
+    async def close(self):
+        # Завершает потоки подписчиков при остановке воркера
+        self._closed = True
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._changed is not None:
+            self._broadcast()
+        if self._redis is not None:
+            await self._redis.aclose()
+
+    def wake(self):
+        # Уведомления сливаются: пока идет чтение, следующее просто запросит еще одно
+        if not self.started:
+            return
+        if self._fetching is not None:
+            self._fetch_again = True
+            return
+        self._fetching = asyncio.get_running_loop().create_task(self._fetch_loop())
+
+    def _redis_client(self):
+        if self._redis is None:
+            self._redis = redis.from_url(REDIS_URL)
+        return self._redis
+
+    async def publish(self):
+        # Публикует и воркер без подписчиков: подписчики могут быть у других
+        try:
+            await self._redis_client().publish(CHANNEL, "")
+        except RedisError as e:
+            logger.warning("Order feed publish failed: %s", e)
+
+    def _broadcast(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _fetch_loop(self):
+        try:
+            while True:
+                self._fetch_again = False
+                try:
+                    await self._fetch_new()
+                except Exception as e:
+                    logger.warning("Order feed read failed: %r", e)
+                if not self._fetch_again:
+                    return
+        finally:
+            self._fetching = None
+
+    async def _fetch_new(self):
+        added = False
+        async with AsyncSessionLocal() as db:
+            while True:
+                rows = (await db.execute(
+                    select(OrderEvent.id, OrderEvent.type, OrderEvent.payload)
+                    .where(OrderEvent.id > self.last_id)
+                    .order_by(OrderEvent.id)
+                    .limit(DB_PAGE_SIZE)
+                )).all()
+                for event_id, event_type, payload in rows:
+                    if event_id <= self.last_id:
+                        continue
+                    if len(self._ids) == self._ids.maxlen:
+                        self._floor = self._ids[0]
+                    self._ids.append(event_id)
+                    self._frames.append(_frame(event_id, event_type, payload))
+                    self.last_id = event_id
+                    added = True
+                if len(rows) < DB_PAGE_SIZE:
+                    break
+        if added:
+            self._broadcast()
+
+    async def _tick(self):
+        # Общий на всех подписчиков таймер: heartbeat и страховочное чтение
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            self.wake()
+            try:
+                await asyncio.shield(self._fetching)
+            except Exception as e:
+                logger.warning("Order feed refresh failed: %r", e)
+            self._broadcast()
+
+    async def _listen_postgres(self):
+        import asyncpg
+
+        dsn = make_url(ASYNC_DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                lost = asyncio.Event()
+                connection.add_termination_listener(lambda _: lost.set())
+                await connection.add_listener(CHANNEL, lambda *_: self.wake())
+                # Пока LISTEN не работал, события могли появиться
+                self.wake()
+                await lost.wait()
+                logger.warning("Order feed LISTEN connection lost")
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.warning("Order feed LISTEN failed: %r", e)
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _listen_redis(self):
+        while True:
+            try:
+                async with self._redis_client().pubsub() as pubsub:
+                    await pubsub.subscribe(CHANNEL)
+                    self.wake()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.wake()
+            except RedisError as e:
+                logger.warning("Order feed subscription failed: %s", e)
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _read_history(self, after: int) -> tuple:
+        # Переподключение дальше буфера: страница событий из БД
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(OrderEvent.id, OrderEvent.type, OrderEvent.payload)
+                .where(OrderEvent.id > after, OrderEvent.id <= self._floor)
+                .order_by(OrderEvent.id)
+                .limit(DB_PAGE_SIZE)
+            )).all()
+            first_id = await db.scalar(select(func.min(OrderEvent.id)))
+        frames = b"".join(_frame(*row) for row in rows)
+        if first_id is not None and after < first_id - 1 and after > 0:
+            # Часть пропущенных событий уже удалена - клиенту нужно перечитать заказы целиком
+            frames = b"event: reset\ndata: {}\n\n" + frames
+        return frames, rows[-1].id if rows else self._floor
+
+    def _since(self, after: int) -> bytes:
+        start = bisect_right(self._ids, after)
+        return b"".join(self._frames[index] for index in range(start, len(self._frames)))
+
+    async def subscribe(self, last_event_id: Optional[int] = None) -> AsyncIterator[bytes]:
+        # Без Last-Event-ID поток начинается с новых событий
+        await self.start()
+        self.subscribers += 1
+        try:
+            position = self.last_id if last_event_id is None else last_event_id
+            yield f"retry: {RETRY_MS}\n\n".encode()
+            while position < self._floor and not self._closed:
+                frames, position = await self._read_history(position)
+                yield frames
+            while not self._closed:
+                changed = self._changed
+                if position < self._floor:
+                    # Подписчик отстал больше чем на буфер
+                    frames, position = await self._read_history(position)
+                else:
+                    # Last-Event-ID может быть впереди ленты этого воркера, если он еще не дочитал
+                    # уведомления - тогда позиция остается у клиента, иначе он получил бы события повторно
+                    frames, position = self._since(position), max(position, self.last_id)
+                if frames:
+                    yield frames
+                    continue
+                await changed.wait()
+                if position >= self.last_id:
+                    yield b": ping\n\n"
+        finally:
+            self.subscribers -= 1
+
+order_feed = OrderFeed()
+
+async def prune_order_events() -> int:
+    # Удаляет события старше ORDER_EVENTS_RETENTION_HOURS; не зависит от того, есть ли подписчики
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=ORDER_EVENTS_RETENTION_HOURS)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(delete(OrderEvent).where(OrderEvent.created_at < cutoff))
+        await db.commit()
+    return result.rowcount
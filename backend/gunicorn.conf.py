@@ -0,0 +1,16 @@
+import os
+
+# Пре-форк режим: приложение импортируется один раз в мастере (preload_app), воркеры получают
+# готовые модули при fork; каждый воркер затем прогревает свой пул и кэш (см. warm_up в main.py)
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+def post_fork(server, worker):
+    # Соединения, если мастер успел их открыть, не должны переходить в воркер через fork
+    from database import async_engine, engine
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
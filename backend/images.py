@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import httpx
+from fastapi.staticfiles import StaticFiles
+from PIL import Image, ImageOps
+
+STATIC_DIR = "static"
+IMAGES_DIR = os.path.join(STATIC_DIR, "images")
+VARIANTS_DIR = os.path.join(IMAGES_DIR, "variants")
+
+# Публичный адрес API для абсолютных ссылок (нужен, например, для send_photo в боте)
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "").rstrip("/")
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+IMAGE_FETCH_TIMEOUT = float(os.getenv("IMAGE_FETCH_TIMEOUT", "15"))
+# Хосты, с которых можно скачивать внешние картинки (через запятую; пусто - только локальные файлы).
+# Скачивание запускает публичный GET /api/products/{id}/images/{variant}, поэтому произвольные адреса запрещены
+IMAGE_FETCH_HOSTS = {host.strip().lower() for host in os.getenv("IMAGE_FETCH_HOSTS", "images.pexels.com").split(",") if host.strip()}
+
+# Размеры вписываются в рамку с сохранением пропорций
+VARIANTS = {"thumb": (400, 400), "medium": (1200, 1200)}
+FORMATS = {"webp": ("WEBP", {"quality": 80, "method": 4}), "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True})}
+EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+# Входит в хэш имени: при изменении параметров нарезки получаются новые имена файлов
+VARIANTS_SPEC = repr((sorted(VARIANTS.items()), sorted((name, sorted(opts.items())) for name, (_, opts) in FORMATS.items())))
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_executor: Optional[ProcessPoolExecutor] = None
+# Идущие нарезки по digest: одновременные запросы одной картинки ждут общую задачу
+_renders: dict = {}
+
+class ImageProcessingError(Exception):
+    pass
+
+def image_digest(source: bytes) -> str:
+    return hashlib.sha256(source + VARIANTS_SPEC.encode()).hexdigest()[:32]
+
+def variant_filename(digest: str, variant: str, image_format: str) -> str:
+    return f"{digest}-{variant}.{EXTENSIONS[image_format]}"
+
+def variants_exist(digest: str) -> bool:
+    return all(
+        os.path.exists(os.path.join(VARIANTS_DIR, variant_filename(digest, variant, image_format)))
+        for variant in VARIANTS for image_format in FORMATS
+    )
+
+def variant_urls(product_id: int, digest: Optional[str]) -> dict:
+    # Готовые варианты отдаются как статика; пока их нет - через эндпоинт, который их построит
+    urls = {}
+    for variant in VARIANTS:
+        urls[variant] = {}
+        for image_format in FORMATS:
+            if digest:
+                path = f"/{STATIC_DIR}/images/variants/{variant_filename(digest, variant, image_format)}"
+            else:
+                path = f"/api/products/{product_id}/images/{variant}?format={image_format}"
+            urls[variant][image_format] = f"{PUBLIC_BASE_URL}{path}"
+    return urls
+
+def render_variants(source: bytes, digest: str, output_dir: str = VARIANTS_DIR) -> str:
+    # Выполняется в отдельном процессе: только байты на входе и пути на выходе
+    try:
+        with Image.open(io.BytesIO(source)) as opened:
+            opened.load()
+            image = ImageOps.exif_transpose(opened)
+            source_format = opened.format
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise ImageProcessingError("Unsupported or corrupted image")
+
+    if image.mode not in ("RGB", "L"):
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.convert("RGBA").split()[-1])
+        image = background
+    else:
+        image = image.convert("RGB")
+
+    os.makedirs(output_dir, exist_ok=True)
+    for variant, size in VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+        for image_format, (pil_format, options) in FORMATS.items():
+            path = os.path.join(output_dir, variant_filename(digest, variant, image_format))
+            if os.path.exists(path):
+                continue
+            # Пишем во временный файл и переименовываем, чтобы не отдать недописанный файл
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            resized.save(tmp_path, pil_format, **options)
+            os.replace(tmp_path, path)
+    return (source_format or "jpeg").lower()
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _executor
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+async def build_variants(source: bytes) -> tuple:
+    # Возвращает (digest, исходный формат); ресайз идет в пуле процессов, не блокируя event loop
+    if len(source) > IMAGE_MAX_BYTES:
+        raise ImageProcessingError("Image is too large")
+    digest = image_digest(source)
+    render = _renders.get(digest)
+    if render is None:
+        loop = asyncio.get_running_loop()
+        render = asyncio.ensure_future(loop.run_in_executor(get_executor(), render_variants, source, digest))
+        _renders[digest] = render
+        # Запись удаляется по завершении нарезки, в том числе с ошибкой
+        render.add_done_callback(lambda _: _renders.pop(digest, None))
+    # shield: отмена одного запроса не отменяет нарезку для остальных
+    source_format = await asyncio.shield(render)
+    return digest, source_format
+
+def save_original(source: bytes, digest: str, source_format: str) -> str:
+    extension = "jpg" if source_format == "jpeg" else source_format
+    filename = f"{digest}.{extension}"
+    path = os.path.join(IMAGES_DIR, filename)
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            f.write(source)
+    return f"/{STATIC_DIR}/images/{filename}"
+
+def _check_fetch_url(url: httpx.URL):
+    if url.scheme not in ("http", "https") or url.host.lower() not in IMAGE_FETCH_HOSTS:
+        raise ImageProcessingError("Image host is not allowed")
+
+async def _check_redirect(request: httpx.Request):
+    # Проверяется и каждый адрес из редиректов
+    _check_fetch_url(request.url)
+
+async def load_source(image_url: str) -> bytes:
+    # Локальные картинки читаются с диска, внешние (hotlink) скачиваются один раз с хостов из IMAGE_FETCH_HOSTS
+    static_prefix = f"/{STATIC_DIR}/"
+    local_path = image_url[len(PUBLIC_BASE_URL):] if PUBLIC_BASE_URL and image_url.startswith(PUBLIC_BASE_URL) else image_url
+    if local_path.startswith(static_prefix):
+        path = os.path.normpath(local_path.lstrip("/"))
+        if not path.startswith(STATIC_DIR + os.sep) or not os.path.exists(path):
+            raise ImageProcessingError("Image file not found")
+        if os.path.getsize(path) > IMAGE_MAX_BYTES:
+            raise ImageProcessingError("Image is too large")
+        with open(path, "rb") as f:
+            return f.read()
+
+    try:
+        _check_fetch_url(httpx.URL(image_url))
+    except httpx.InvalidURL:
+        raise ImageProcessingError("Invalid image URL")
+    chunks, size = [], 0
+    try:
+        async with httpx.AsyncClient(
+            timeout=IMAGE_FETCH_TIMEOUT, follow_redirects=True, event_hooks={"request": [_check_redirect]},
+        ) as client:
+            async with client.stream("GET", image_url) as response:
+                response.raise_for_status()
+                # Content-Length может отсутствовать или быть неверным, поэтому размер считается и по ходу чтения
+                length = response.headers.get("content-length", "")
+                if length.isdigit() and int(length) > IMAGE_MAX_BYTES:
+                    raise ImageProcessingError("Image is too large")
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > IMAGE_MAX_BYTES:
+                        raise ImageProcessingError("Image is too large")
+                    chunks.append(chunk)
+    except httpx.HTTPError as e:
+        raise ImageProcessingError(f"Cannot download image: {e}")
+    return b"".join(chunks)
+
+class CachedStaticFiles(StaticFiles):
+    # Имена вариантов содержат хэш содержимого, поэтому их можно кэшировать навсегда
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if os.path.basename(os.path.dirname(full_path)) == "variants":
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
@@ -0,0 +1,208 @@
+import logging
+import os
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from starlette.routing import Match
+
+# Заголовки X-DB-Queries и Server-Timing в ответах (удобно ловить N+1 в разработке)
+DEBUG = os.getenv("DEBUG", "false").lower() == "true"
+# Порог медленного запроса к БД в миллисекундах, 0 - лог выключен
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+logger = logging.getLogger(__name__)
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple, buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = defaultdict(lambda: [[0] * (len(buckets) + 1), 0.0, 0])
+
+    def observe(self, label_values: tuple, value: float):
+        counts, _, _ = series = self._series[label_values]
+        counts[bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in sorted(self._series.items()):
+            labels = _format_labels(self.labels, label_values)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound:g}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = (), kind: str = "counter"):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.kind = kind
+        self._values = defaultdict(float)
+
+    def inc(self, label_values: tuple = (), value: float = 1):
+        self._values[label_values] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for label_values, value in sorted(self._values.items()):
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}{{{labels}}} {value:g}" if labels else f"{self.name} {value:g}")
+        return lines
+
+def _format_labels(names: tuple, values: tuple) -> str:
+    return ",".join(
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    )
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route"), LATENCY_BUCKETS
+)
+REQUESTS = Counter("http_requests_total", "HTTP requests by status", ("method", "route", "status"))
+IN_FLIGHT = Counter("http_requests_in_flight", "HTTP requests being processed", ("method", "route"), kind="gauge")
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries", "DB queries per HTTP request", ("method", "route"), QUERY_COUNT_BUCKETS
+)
+REQUEST_DB_TIME = Counter(
+    "http_request_db_seconds_total", "Time spent in DB queries by route", ("method", "route")
+)
+DB_QUERY_DURATION = Histogram("db_query_duration_seconds", "DB query latency", ("engine",), LATENCY_BUCKETS)
+SLOW_QUERIES = Counter("db_slow_queries_total", "DB queries slower than SLOW_QUERY_MS", ("engine",))
+ADMISSION_REJECTED = Counter(
+    "http_requests_rejected_total", "Requests rejected with 503 by route concurrency limits", ("method", "route")
+)
+COALESCED_REQUESTS = Counter("http_requests_coalesced_total", "Reads served by another in-flight identical request")
+
+# Счетчики текущего HTTP-запроса; события SQLAlchemy видят их через contextvar
+class RequestStats:
+    __slots__ = ("queries", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+_engines: dict = {}
+
+def instrument_engine(engine, name: str):
+    # Для AsyncEngine события вешаются на его sync_engine; они выполняются в контексте задачи запроса
+    sync_engine = getattr(engine, "sync_engine", engine)
+    _engines[name] = sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        DB_QUERY_DURATION.observe((name,), elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += elapsed
+        if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+            SLOW_QUERIES.inc((name,))
+            logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, " ".join(statement.split())[:2000])
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _handle_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+def _pool_lines() -> list:
+    lines = []
+    for metric, method, help_text in (
+        ("db_pool_size", "size", "Configured pool size"),
+        ("db_pool_checked_out", "checkedout", "Connections currently checked out"),
+        ("db_pool_overflow", "overflow", "Connections opened above pool size"),
+    ):
+        samples = []
+        for name, engine in sorted(_engines.items()):
+            # NullPool/StaticPool (например, SQLite в памяти) этих счетчиков не имеют
+            getter = getattr(engine.pool, method, None)
+            if getter is not None:
+                # overflow() у QueuePool отрицателен, пока пул не заполнен до pool_size
+                samples.append(f'{metric}{{engine="{name}"}} {max(getter(), 0)}')
+        if samples:
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge", *samples]
+    return lines
+
+def render_metrics() -> str:
+    lines = []
+    for metric in (
+        REQUEST_DURATION, REQUESTS, IN_FLIGHT, REQUEST_DB_QUERIES, REQUEST_DB_TIME, DB_QUERY_DURATION, SLOW_QUERIES,
+        ADMISSION_REJECTED, COALESCED_REQUESTS,
+    ):
+        lines += metric.render()
+    lines += _pool_lines()
+    return "\n".join(lines) + "\n"
+
+def route_label(routes, scope) -> str:
+    # Шаблон пути (/api/products/{product_id}), а не сам путь - иначе метрик будет по числу id
+    partial = None
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or "unmatched"
+
+class MetricsMiddleware:
+    # Чистый ASGI middleware: не буферизует ответ и не мешает StreamingResponse
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        labels = (scope["method"], route_label(self.routes, scope))
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+        IN_FLIGHT.inc(labels)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if DEBUG:
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-db-queries", str(stats.queries).encode()))
+                    headers.append((
+                        b"server-timing",
+                        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", app;dur={elapsed_ms:.1f}'.encode(),
+                    ))
+                    message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            IN_FLIGHT.inc(labels, -1)
+            REQUEST_DURATION.observe(labels, time.perf_counter() - started)
+            REQUESTS.inc(labels + (str(status_code),))
+            REQUEST_DB_QUERIES.observe(labels, stats.queries)
+            REQUEST_DB_TIME.inc(labels, stats.db_time)
@@ -0,0 +1,53 @@
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy.engine import make_url
+from database import DATABASE_URL, engine, Base
+import models  # noqa: F401 - регистрирует таблицы в Base.metadata для autogenerate
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+def include_object(obj, name, type_, reflected, compare_to):
+    # Таблицы SQLite, которые создаются миграциями вручную и в моделях не описаны:
+    # FTS5 (products_fts и служебные) и индекс атрибутов product_attributes
+    if type_ == "table" and reflected and compare_to is None and name.startswith(("products_fts", "product_attributes")):
+        return False
+    # Индексы моделей только для другой СУБД (.ddl_if(dialect=...)), например GIN PostgreSQL при работе на SQLite
+    ddl_if = getattr(obj, "_ddl_if", None)
+    if type_ == "index" and ddl_if is not None and ddl_if.dialect and ddl_if.dialect != make_url(DATABASE_URL).get_backend_name():
+        return False
+    return True
+
+def run_migrations_offline():
+    # alembic upgrade head --sql: вывод SQL без подключения к базе
+    context.configure(
+        url=DATABASE_URL,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=DATABASE_URL.startswith("sqlite"),
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    # Синхронный движок из database.py: миграции - одноразовая служебная операция
+    with engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+            # SQLite не умеет ALTER большинства ограничений, поэтому там - batch-режим
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
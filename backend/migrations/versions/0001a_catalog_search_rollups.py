@@ -0,0 +1,118 @@
+"""catalog indexes, search, sales rollups, image hash
+
+Объекты, которые появились до перехода на миграции, но в исходной схеме 0001 их нет:
+индексы для постраничной выдачи, полнотекстовый поиск, агрегаты продаж и products.image_hash.
+Для существующих данных заполняются индекс FTS5 и sales_rollups.
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-18 07:15:36.839615
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001a'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Выражение должно совпадать с models.product_search_vector, иначе PostgreSQL не использует индекс
+PRODUCT_SEARCH_VECTOR = (
+    "to_tsvector('russian', coalesce(name, '') || ' ' || coalesce(description, '') "
+    "|| ' ' || coalesce(specifications, ''))"
+)
+
+FTS_TABLE = "products_fts"
+FTS_COLUMNS = "name, description, specifications"
+SQLITE_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        {FTS_COLUMNS}, content='products', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON products BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {FTS_COLUMNS}) VALUES (new.id, new.name, new.description, new.specifications);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {FTS_COLUMNS}) VALUES ('delete', old.id, old.name, old.description, old.specifications);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {FTS_COLUMNS}) VALUES ('delete', old.id, old.name, old.description, old.specifications);
+        INSERT INTO {FTS_TABLE}(rowid, {FTS_COLUMNS}) VALUES (new.id, new.name, new.description, new.specifications);
+    END""",
+]
+
+# Агрегаты по истории заказов (копия analytics.rebuild_rollups); дни считаются в UTC
+ROLLUPS_BACKFILL = """INSERT INTO sales_rollups (day, product_id, source, status, order_count, total_sqm, revenue)
+    SELECT {day}, product_id, coalesce(source, 'unknown'), status,
+           count(id), coalesce(sum(quantity_sqm), 0), coalesce(sum(total_price), 0)
+    FROM orders
+    WHERE product_id IS NOT NULL AND status IS NOT NULL
+    GROUP BY {day}, product_id, coalesce(source, 'unknown'), status"""
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+
+    op.create_index('ix_products_category_price', 'products', ['category', 'price_per_sqm'], unique=False)
+    op.create_index('ix_products_created_at_id', 'products', ['created_at', 'id'], unique=False)
+    op.create_index('ix_orders_created_at_id', 'orders', ['created_at', 'id'], unique=False)
+    op.create_index('ix_orders_product_id_created_at_id', 'orders', ['product_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_orders_source_created_at_id', 'orders', ['source', 'created_at', 'id'], unique=False)
+    op.create_index('ix_orders_status_created_at_id', 'orders', ['status', 'created_at', 'id'], unique=False)
+
+    # Полнотекстовый поиск: GIN в PostgreSQL, FTS5 с триггерами в SQLite (см. search.py)
+    if dialect == 'postgresql':
+        op.create_index(
+            'ix_products_search', 'products', [sa.text(PRODUCT_SEARCH_VECTOR)], unique=False, postgresql_using='gin'
+        )
+    elif dialect == 'sqlite':
+        for statement in SQLITE_FTS_DDL:
+            op.execute(statement)
+        # Продукты, созданные до появления индекса
+        op.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+    op.create_table('sales_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('source', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('total_sqm', sa.Float(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('day', 'product_id', 'source', 'status', name='uq_sales_rollups_key')
+    )
+    op.create_index(op.f('ix_sales_rollups_id'), 'sales_rollups', ['id'], unique=False)
+    day = "date(timezone('UTC', created_at))" if dialect == 'postgresql' else "date(created_at)"
+    op.execute(ROLLUPS_BACKFILL.format(day=day))
+
+    # Без batch-режима: пересоздание products в SQLite удалило бы триггеры FTS5
+    op.add_column('products', sa.Column('image_hash', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('products', 'image_hash')
+
+    op.drop_index(op.f('ix_sales_rollups_id'), table_name='sales_rollups')
+    op.drop_table('sales_rollups')
+
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_index('ix_products_search', table_name='products')
+    elif dialect == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        op.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+    op.drop_index('ix_orders_status_created_at_id', table_name='orders')
+    op.drop_index('ix_orders_source_created_at_id', table_name='orders')
+    op.drop_index('ix_orders_product_id_created_at_id', table_name='orders')
+    op.drop_index('ix_orders_created_at_id', table_name='orders')
+    op.drop_index('ix_products_created_at_id', table_name='products')
+    op.drop_index('ix_products_category_price', table_name='products')
@@ -0,0 +1,144 @@
+"""product attributes and facets
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 13:20:48.116502
+
+"""
+import json
+import re
+from collections import Counter
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Разбор specifications на момент миграции (копия attributes.parse_specifications, чтобы
+# дальнейшие изменения приложения не меняли уже примененную миграцию)
+ATTRIBUTE_LABELS = {
+    "толщина": ("thickness_mm", "мм"),
+    "ширина": ("width_mm", "мм"),
+    "длина панели": ("panel_length_m", "м"),
+    "покрытие": ("coating", None),
+    "профиль": ("profile", None),
+    "материал": ("material", None),
+    "цвет": ("color", None),
+}
+PAIR_SEPARATOR = re.compile(r",\s*(?=[^,:]+:)")
+NUMBER = re.compile(r"\d+(?:[.,]\d+)?")
+FACETS = ("category", "thickness_mm", "coating")
+
+# Индекс атрибутов в SQLite: строки (product_id, name, value) поддерживают триггеры на products.
+# У value нет типа, поэтому числа и строки из JSON сравниваются без приведения (см. attributes.py)
+ATTRIBUTES_TABLE = "product_attributes"
+ATTRIBUTES_ROWS = (
+    f"INSERT INTO {ATTRIBUTES_TABLE}(product_id, name, value) "
+    "SELECT new.id, key, value FROM json_each(new.attributes) "
+    "WHERE json_type(new.attributes) = 'object' AND type NOT IN ('object', 'array', 'null');"
+)
+SQLITE_ATTRIBUTES_DDL = [
+    f"""CREATE TABLE {ATTRIBUTES_TABLE} (
+        product_id INTEGER NOT NULL REFERENCES products(id),
+        name TEXT NOT NULL,
+        value,
+        PRIMARY KEY (product_id, name)
+    )""",
+    f"CREATE INDEX ix_{ATTRIBUTES_TABLE}_name_value ON {ATTRIBUTES_TABLE} (name, value, product_id)",
+    f"""CREATE TRIGGER {ATTRIBUTES_TABLE}_ai AFTER INSERT ON products BEGIN
+        {ATTRIBUTES_ROWS}
+    END""",
+    f"""CREATE TRIGGER {ATTRIBUTES_TABLE}_ad AFTER DELETE ON products BEGIN
+        DELETE FROM {ATTRIBUTES_TABLE} WHERE product_id = old.id;
+    END""",
+    f"""CREATE TRIGGER {ATTRIBUTES_TABLE}_au AFTER UPDATE OF attributes ON products BEGIN
+        DELETE FROM {ATTRIBUTES_TABLE} WHERE product_id = old.id;
+        {ATTRIBUTES_ROWS}
+    END""",
+]
+
+
+def parse_specifications(specifications):
+    attributes = {}
+    for pair in PAIR_SEPARATOR.split((specifications or "").strip()):
+        label, _, value = pair.partition(":")
+        label, value = label.strip().lower(), value.strip()
+        if not label or not value:
+            continue
+        key, unit = ATTRIBUTE_LABELS.get(label, (label, None))
+        if unit:
+            number = NUMBER.search(value)
+            if number:
+                attributes[key] = float(number.group().replace(",", "."))
+        else:
+            attributes[key] = value
+    return attributes or None
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    # Без batch-режима: пересоздание products в SQLite удалило бы триггеры FTS5
+    op.add_column('products', sa.Column(
+        'attributes', sa.JSON(none_as_null=True).with_variant(postgresql.JSONB(none_as_null=True), 'postgresql'),
+        nullable=True,
+    ))
+    if dialect == 'postgresql':
+        op.create_index(
+            'ix_products_attributes', 'products', ['attributes'], unique=False,
+            postgresql_using='gin', postgresql_ops={'attributes': 'jsonb_path_ops'},
+        )
+    elif dialect == 'sqlite':
+        for statement in SQLITE_ATTRIBUTES_DDL:
+            op.execute(statement)
+
+    facets_table = op.create_table('product_facets',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('facet', sa.String(), nullable=False),
+    sa.Column('value', sa.String(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('facet', 'value', name='uq_product_facets_key')
+    )
+
+    # Атрибуты существующих продуктов и начальные счетчики фасетов
+    bind = op.get_bind()
+    update = "UPDATE products SET attributes = CAST(:attributes AS JSONB) WHERE id = :id" if dialect == 'postgresql' \
+        else "UPDATE products SET attributes = :attributes WHERE id = :id"
+    counts = Counter()
+    products = bind.execute(sa.text("SELECT id, category, specifications FROM products")).all()
+    for product_id, category, specifications in products:
+        attributes = parse_specifications(specifications)
+        if attributes:
+            bind.execute(
+                sa.text(update),
+                {"attributes": json.dumps(attributes, ensure_ascii=False), "id": product_id},
+            )
+        if category:
+            counts["category", category] += 1
+        for name in FACETS[1:]:
+            value = (attributes or {}).get(name)
+            if value is not None:
+                counts[name, f"{value:g}" if isinstance(value, float) else str(value)] += 1
+    if counts:
+        op.bulk_insert(facets_table, [
+            {"facet": facet, "value": value, "count": count} for (facet, value), count in counts.items()
+        ])
+
+
+def downgrade() -> None:
+    op.drop_table('product_facets')
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_index('ix_products_attributes', table_name='products', postgresql_using='gin')
+    elif dialect == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {ATTRIBUTES_TABLE}_{suffix}")
+        op.execute(f"DROP TABLE IF EXISTS {ATTRIBUTES_TABLE}")
+    op.drop_column('products', 'attributes')
@@ -1,8 +1,17 @@
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy import BigInteger, Column, Integer, String, Float, Text, Date, DateTime, Boolean, ForeignKey, Index, JSON, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, literal_column
 from database import Base
 
+def product_search_vector(name, description, specifications):
+    # Выражение для полнотекстового поиска в PostgreSQL; в запросах должно совпадать с индексом,
+    # поэтому константы - литералы, а не bind-параметры
+    empty, space = literal_column("''"), literal_column("' '")
+    document = func.coalesce(name, empty).concat(space).concat(func.coalesce(description, empty)) \
+        .concat(space).concat(func.coalesce(specifications, empty))
+    return func.to_tsvector(literal_column("'russian'"), document)
+
 class User(Base):
     __tablename__ = "users"
     
@@ -25,12 +34,34 @@ class Product(Base):
     price_per_sqm = Column(Float)  # Цена за м²
     category = Column(String)
     image_url = Column(String)
+    image_hash = Column(String, nullable=True)  # Хэш исходной картинки, из него строятся имена вариантов
     video_url = Column(String, nullable=True)
     specifications = Column(Text)  # JSON string with technical specs
+    # Характеристики для фильтров и фасетов: {"thickness_mm": 0.5, "coating": "полиэстер"}, см. attributes.py
+    attributes = Column(JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql"), nullable=True)
     is_available = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        # Keyset-пагинация каталога по (created_at, id)
+        Index("ix_products_created_at_id", "created_at", "id"),
+        # Полнотекстовый поиск: GIN по tsvector в PostgreSQL (в SQLite - FTS5, см. search.py)
+        Index(
+            "ix_products_search",
+            product_search_vector(name, description, specifications),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+        Index("ix_products_category_price", "category", "price_per_sqm"),
+        # Фильтры по атрибутам (@>): GIN в PostgreSQL (в SQLite - таблица product_attributes, см. attributes.py)
+        Index(
+            "ix_products_attributes",
+            "attributes",
+            postgresql_using="gin",
+            postgresql_ops={"attributes": "jsonb_path_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
+
 class Order(Base):
     __tablename__ = "orders"
     
@@ -50,14 +81,105 @@ class Order(Base):
     product = relationship("Product")
     user = relationship("User", back_populates="orders")
 
+    __table_args__ = (
+        # Keyset-пагинация заказов по (created_at, id), в том числе с фильтрами
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_orders_source_created_at_id", "source", "created_at", "id"),
+        Index("ix_orders_product_id_created_at_id", "product_id", "created_at", "id"),
+    )
+
+class SalesRollup(Base):
+    __tablename__ = "sales_rollups"
+
+    # Агрегаты продаж день x продукт x источник x статус, обновляются вместе с заказами
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    source = Column(String, nullable=False)
+    status = Column(String, nullable=False)
+    order_count = Column(Integer, nullable=False, default=0)
+    total_sqm = Column(Float, nullable=False, default=0)  # Сумма м²
+    revenue = Column(Float, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("day", "product_id", "source", "status", name="uq_sales_rollups_key"),
+    )
+
+class ProductFacet(Base):
+    __tablename__ = "product_facets"
+
+    # Число продуктов на значение фасета (категория, толщина, покрытие), обновляется вместе с продуктами
+    id = Column(Integer, primary_key=True)
+    facet = Column(String, nullable=False)
+    value = Column(String, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("facet", "value", name="uq_product_facets_key"),
+    )
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+
+    # Побочные эффекты (уведомления, CRM) пишутся в одной транзакции с заказом и выполняются воркером outbox.py
+    id = Column(Integer, primary_key=True)
+    topic = Column(String, nullable=False)  # order.email, order.crm
+    payload = Column(Text, nullable=False)  # JSON
+    status = Column(String, nullable=False, default="pending")  # pending, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime(timezone=True), nullable=False)  # не раньше этого времени (ретраи, аренда)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_outbox_events_status_available_at", "status", "available_at"),
+    )
+
+class OrderEvent(Base):
+    __tablename__ = "order_events"
+
+    # Лента изменений заказов для GET /api/orders/stream, пишется в транзакции с заказом; id - id события SSE
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    type = Column(String, nullable=False)  # order.created, order.status_changed
+    payload = Column(Text, nullable=False)  # JSON
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_order_events_created_at", "created_at"),
+        # id не переиспользуются после очистки старых событий, иначе Last-Event-ID указывал бы в будущее
+        {"sqlite_autoincrement": True},
+    )
+
 class TelegramUser(Base):
     __tablename__ = "telegram_users"
     
     id = Column(Integer, primary_key=True, index=True)
-    telegram_id = Column(Integer, unique=True, index=True)
+    telegram_id = Column(BigInteger, unique=True, index=True)  # id пользователя Telegram не помещается в 32 бита
     username = Column(String, nullable=True)
     first_name = Column(String, nullable=True)
     last_name = Column(String, nullable=True)
     phone = Column(String, nullable=True)
-    is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    is_active = Column(Boolean, default=True)  # False - заблокировал бота, рассылки ему не идут
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class Broadcast(Base):
+    __tablename__ = "broadcasts"
+
+    # Рассылка по активным TelegramUser (broadcast.py); last_user_id - точка, с которой она продолжится
+    id = Column(Integer, primary_key=True)
+    text = Column(Text, nullable=False)
+    parse_mode = Column(String, nullable=True)  # HTML, MarkdownV2
+    status = Column(String, nullable=False, default="pending")  # pending, running, done
+    last_user_id = Column(Integer, nullable=False, default=0)  # TelegramUser.id, до которого все обработано
+    sent = Column(Integer, nullable=False, default=0)
+    blocked = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    # Процесс, который ведет рассылку, и до какого момента она за ним; продлевается, пока он жив
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
\ No newline at end of file
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import os
+from types import SimpleNamespace
+from typing import Optional
+from sqlalchemy import insert
+from database import AsyncSessionLocal
+from models import Order
+from analytics import record_orders
+from outbox import add_order_events, notify
+from feed import ORDER_CREATED, notify as notify_feed, record_order_events
+from pricing import pricing_engine
+
+# Групповой коммит POST /api/orders: заказы, пришедшие почти одновременно, пишутся одной транзакцией
+ORDER_GROUP_COMMIT = os.getenv("ORDER_GROUP_COMMIT", "true").lower() == "true"
+# Сколько ждать попутных заказов после первого, мс; добавляется к задержке ответа
+ORDER_BATCH_WINDOW_MS = float(os.getenv("ORDER_BATCH_WINDOW_MS", "5"))
+ORDER_BATCH_MAX_SIZE = int(os.getenv("ORDER_BATCH_MAX_SIZE", "200"))
+
+logger = logging.getLogger(__name__)
+
+class ProductNotFound(Exception):
+    pass
+
+async def insert_orders(db, rows: list) -> list:
+    # rows - поля OrderCreate плюс total_price. Один INSERT ... RETURNING; агрегаты продаж,
+    # события outbox и ленты заказов пишутся в той же транзакции, коммит - за вызывающим
+    statement = insert(Order).returning(Order.id, Order.created_at, Order.status, sort_by_parameter_order=True)
+    result = await db.execute(statement, rows)
+    created = [
+        dict(row, id=order_id, created_at=created_at, status=status)
+        for row, (order_id, created_at, status) in zip(rows, result.all())
+    ]
+    await record_orders(db, [SimpleNamespace(**order) for order in created])
+    await add_order_events(db, created)
+    await record_order_events(db, ORDER_CREATED, created)
+    return created
+
+async def price_orders(orders: list) -> list:
+    # Цена заказа считается тем же движком, что и /api/quote: строка заказа = строка сметы
+    lines = await pricing_engine.price_lines([(order["product_id"], order["quantity_sqm"]) for order in orders])
+    return [
+        dict(order, total_price=line.total) if line is not None else ProductNotFound(order["product_id"])
+        for order, line in zip(orders, lines)
+    ]
+
+async def write_orders(orders: list) -> list:
+    # Возвращает для каждого заказа сохраненную строку или ProductNotFound
+    results = await price_orders(orders)
+    rows = [row for row in results if not isinstance(row, Exception)]
+    indexes = [index for index, row in enumerate(results) if not isinstance(row, Exception)]
+    async with AsyncSessionLocal() as db:
+        if rows:
+            for index, created in zip(indexes, await insert_orders(db, rows)):
+                results[index] = created
+            await db.commit()
+            notify()
+            notify_feed()
+    return results
+
+class OrderBatcher:
+    def __init__(self, window_ms: float, max_size: int, enabled: bool = True):
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self.enabled = enabled
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, order: dict) -> dict:
+        # Возвращается после коммита транзакции, в которую попал заказ
+        if not self.enabled:
+            result = (await write_orders([order]))[0]
+        else:
+            if self._task is None:
+                self._queue = asyncio.Queue()
+                self._task = asyncio.create_task(self._run())
+            future = asyncio.get_running_loop().create_future()
+            self._queue.put_nowait((order, future))
+            result = await future
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def _run(self):
+        # Один писатель на процесс: пока идет коммит, следующие заказы копятся в очереди
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            if self.window and self._queue.qsize() < self.max_size - 1:
+                await asyncio.sleep(self.window)
+            batch = [item]
+            stop = False
+            while len(batch) < self.max_size and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stop:
+                return
+
+    async def _flush(self, batch: list):
+        orders = [order for order, _ in batch]
+        try:
+            results = await write_orders(orders)
+        except Exception as e:
+            if len(batch) == 1:
+                results = [e]
+            else:
+                # Ошибка одного заказа не должна отменять остальные: пишем пакет по одному
+                logger.warning("Order batch of %s failed, retrying one by one: %r", len(batch), e)
+                results = []
+                for order in orders:
+                    try:
+                        results.extend(await write_orders([order]))
+                    except Exception as single_error:
+                        results.append(single_error)
+        for (_, future), result in zip(batch, results):
+            # Клиент мог отключиться; заказ при этом все равно сохранен
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def close(self):
+        # Дописывает уже принятые заказы и останавливает писателя
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+order_batcher = OrderBatcher(ORDER_BATCH_WINDOW_MS, ORDER_BATCH_MAX_SIZE, enabled=ORDER_GROUP_COMMIT)
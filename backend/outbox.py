@@ -0,0 +1,194 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import smtplib
+import time
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from typing import Optional
+import httpx
+from sqlalchemy import insert, select, update
+from database import DATABASE_URL, AsyncSessionLocal
+from feed import ORDER_EVENTS_PRUNE_INTERVAL, prune_order_events
+from models import OutboxEvent
+
+SMTP_HOST = os.getenv("SMTP_HOST", "")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER", "")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+EMAIL_FROM = os.getenv("EMAIL_FROM", "no-reply@triformstack.com")
+# Куда отправлять уведомления о новых заказах; пусто - письма не отправляются
+MANAGER_EMAIL = os.getenv("MANAGER_EMAIL", "")
+# Webhook CRM, принимающий заказ в JSON; пусто - синхронизация выключена
+CRM_WEBHOOK_URL = os.getenv("CRM_WEBHOOK_URL", "")
+CRM_TIMEOUT = float(os.getenv("CRM_TIMEOUT", "10"))
+
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+# Пауза перед повтором в секундах, удваивается с каждой попыткой
+OUTBOX_RETRY_BACKOFF = float(os.getenv("OUTBOX_RETRY_BACKOFF", "5"))
+# Сколько событие считается занятым воркером; если воркер упал, событие вернется в очередь
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+
+logger = logging.getLogger(__name__)
+
+_wakeup = asyncio.Event()
+
+def _send_order_email(order: dict):
+    message = EmailMessage()
+    message["Subject"] = f"Новый заказ #{order['id']}"
+    message["From"] = EMAIL_FROM
+    message["To"] = MANAGER_EMAIL
+    message.set_content(
+        f"Заказ #{order['id']} от {order['created_at']}\n"
+        f"Продукт: {order['product_id']}, {order['quantity_sqm']} м², {order['total_price']} ₽\n"
+        f"Клиент: {order['customer_name']}, {order['customer_phone']}, {order['customer_email']}\n"
+        f"Источник: {order['source']}\n"
+        f"Комментарий: {order.get('message') or '-'}\n"
+    )
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30) as smtp:
+        if SMTP_PORT == 587:
+            smtp.starttls()
+        if SMTP_USER:
+            smtp.login(SMTP_USER, SMTP_PASSWORD)
+        smtp.send_message(message)
+
+async def send_order_email(order: dict):
+    # smtplib блокирующий, поэтому письмо уходит из потока
+    await asyncio.to_thread(_send_order_email, order)
+
+async def sync_order_to_crm(order: dict):
+    async with httpx.AsyncClient(timeout=CRM_TIMEOUT) as client:
+        response = await client.post(CRM_WEBHOOK_URL, json=order)
+        response.raise_for_status()
+
+HANDLERS = {
+    "order.email": send_order_email,
+    "order.crm": sync_order_to_crm,
+}
+
+# Событие на каждый получатель: при ретрае CRM письмо не уходит повторно
+ORDER_TOPICS = [
+    topic for topic, enabled in (
+        ("order.email", bool(SMTP_HOST and MANAGER_EMAIL)),
+        ("order.crm", bool(CRM_WEBHOOK_URL)),
+    ) if enabled
+]
+
+async def add_order_events(db, orders: list):
+    # Вызывается в транзакции, которая сохраняет заказы: события появляются только вместе с ними
+    if not ORDER_TOPICS or not orders:
+        return
+    now = datetime.now(timezone.utc)
+    rows = [
+        {"topic": topic, "payload": json.dumps(order, ensure_ascii=False, default=str), "status": "pending",
+         "attempts": 0, "available_at": now}
+        for order in orders for topic in ORDER_TOPICS
+    ]
+    await db.execute(insert(OutboxEvent), rows)
+
+def notify():
+    # Будит воркер в этом же процессе, не дожидаясь OUTBOX_POLL_INTERVAL
+    _wakeup.set()
+
+async def claim_events(limit: int) -> list:
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as db:
+        query = (
+            select(OutboxEvent)
+            .where(OutboxEvent.status == "pending", OutboxEvent.available_at <= now)
+            .order_by(OutboxEvent.id)
+            .limit(limit)
+        )
+        if not DATABASE_URL.startswith("sqlite"):
+            # Несколько воркеров не берут одни и те же события
+            query = query.with_for_update(skip_locked=True)
+        events = (await db.execute(query)).scalars().all()
+        for event in events:
+            event.available_at = now + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+        await db.commit()
+    return events
+
+async def _handle(event) -> Optional[Exception]:
+    handler = HANDLERS.get(event.topic)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler for topic {event.topic}")
+        await handler(json.loads(event.payload))
+    except Exception as e:
+        return e
+    return None
+
+async def process_batch(limit: int = OUTBOX_BATCH_SIZE) -> int:
+    events = await claim_events(limit)
+    if not events:
+        return 0
+    errors = await asyncio.gather(*(_handle(event) for event in events))
+
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as db:
+        for event, error in zip(events, errors):
+            attempts = event.attempts + 1
+            if error is None:
+                values = {"status": "done", "processed_at": now, "last_error": None}
+            elif attempts >= OUTBOX_MAX_ATTEMPTS:
+                logger.error("Outbox event %s (%s) failed permanently: %r", event.id, event.topic, error)
+                values = {"status": "failed", "processed_at": now, "last_error": repr(error)[:2000]}
+            else:
+                logger.warning("Outbox event %s (%s) failed, attempt %s: %r", event.id, event.topic, attempts, error)
+                delay = OUTBOX_RETRY_BACKOFF * 2 ** (attempts - 1)
+                values = {"available_at": now + timedelta(seconds=delay), "last_error": repr(error)[:2000]}
+            await db.execute(update(OutboxEvent).where(OutboxEvent.id == event.id).values(attempts=attempts, **values))
+        await db.commit()
+    return len(events)
+
+async def drain():
+    while await process_batch() == OUTBOX_BATCH_SIZE:
+        pass
+
+async def prune_events():
+    # Заодно с outbox воркер чистит ленту заказов (order_events): API-процессы без подписчиков ее не трогают
+    try:
+        deleted = await prune_order_events()
+    except Exception as e:
+        logger.warning("Order events cleanup failed: %r", e)
+        return
+    if deleted:
+        logger.info("Deleted %s old order events", deleted)
+
+async def _once():
+    await drain()
+    await prune_events()
+
+async def run_worker():
+    logger.info("Outbox worker started, topics: %s", ", ".join(ORDER_TOPICS) or "none")
+    pruned_at = None
+    while True:
+        if pruned_at is None or time.monotonic() - pruned_at >= ORDER_EVENTS_PRUNE_INTERVAL:
+            pruned_at = time.monotonic()
+            await prune_events()
+        try:
+            processed = await process_batch()
+        except Exception as e:
+            logger.exception("Outbox batch failed: %s", e)
+            processed = 0
+        if processed < OUTBOX_BATCH_SIZE:
+            # Очередь разобрана - ждем нового заказа в этом процессе или следующего опроса
+            try:
+                await asyncio.wait_for(_wakeup.wait(), OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            _wakeup.clear()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Outbox worker: order notifications and CRM sync")
+    parser.add_argument("--once", action="store_true", help="обработать доступные события, очистить старые события ленты и выйти")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.once:
+        asyncio.run(_once())
+    else:
+        asyncio.run(run_worker())
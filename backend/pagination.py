@@ -0,0 +1,62 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException, Response
+from sqlalchemy import literal, tuple_
+from database import DATABASE_URL
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def created_at_bound(value: datetime):
+    # SQLite хранит server_default (CURRENT_TIMESTAMP) строкой без микросекунд,
+    # поэтому сравниваем с литералом в том же формате, иначе строки с одинаковой секундой теряются
+    if DATABASE_URL.startswith("sqlite"):
+        fmt = "%Y-%m-%d %H:%M:%S.%f" if value.microsecond else "%Y-%m-%d %H:%M:%S"
+        return literal(value.strftime(fmt))
+    return value
+
+def paginate(query, model, limit: int, cursor: Optional[str] = None, skip: int = 0, descending: bool = False):
+    # Стабильный порядок по (created_at, id); курсор - keyset, skip - для совместимости
+    if descending:
+        query = query.order_by(model.created_at.desc(), model.id.desc())
+    else:
+        query = query.order_by(model.created_at.asc(), model.id.asc())
+
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        key = tuple_(model.created_at, model.id)
+        bound = tuple_(created_at_bound(created_at), literal(row_id))
+        query = query.where(key < bound if descending else key > bound)
+    elif skip:
+        query = query.offset(skip)
+
+    # Берем на одну строку больше, чтобы понять, есть ли следующая страница
+    return query.limit(limit + 1)
+
+def split_page(rows, limit: int):
+    # Отрезает лишнюю строку и возвращает (строки страницы, курсор следующей страницы или None)
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last.created_at, last.id)
+
+def set_next_cursor(response: Response, rows, limit: int):
+    rows, next_cursor = split_page(rows, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
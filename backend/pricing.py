@@ -0,0 +1,207 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from bisect import bisect_right
+from typing import NamedTuple, Optional
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from database import AsyncSessionLocal
+from models import Product
+
+# Правила скидок (JSON, см. pricing_rules.example.json); пусто - скидок нет
+PRICING_RULES_FILE = os.getenv("PRICING_RULES_FILE", "")
+# Таблица цен в любом случае перечитывается не реже чем раз в PRICE_TABLE_TTL секунд
+PRICE_TABLE_TTL = float(os.getenv("PRICE_TABLE_TTL", "30"))
+# С Redis изменение продуктов в одном воркере увеличивает версию цен, остальные сверяют ее перед
+# каждым расчетом и перечитывают таблицу. Без Redis другие воркеры видят изменения через PRICE_TABLE_TTL
+REDIS_URL = os.getenv("REDIS_URL")
+PRICE_VERSION_KEY = "pricing:version"
+
+logger = logging.getLogger(__name__)
+
+class ProductPrice(NamedTuple):
+    name: str
+    category: Optional[str]
+    price_per_sqm: float
+
+class PriceLine(NamedTuple):
+    product_id: int
+    name: str
+    category: Optional[str]
+    quantity_sqm: float
+    price_per_sqm: float
+    subtotal: float
+    discount_rate: float
+    discount: float
+    total: float
+
+class DiscountRule:
+    # Скидка по количеству м² в строке: ступени (min_sqm, discount), max_discount ограничивает итог
+    def __init__(self, tiers: list, max_discount: float = 1.0):
+        tiers = sorted((float(tier["min_sqm"]), float(tier["discount"])) for tier in tiers)
+        for _, discount in tiers:
+            if not 0 <= discount < 1:
+                raise ValueError(f"Discount must be in [0, 1): {discount}")
+        self.thresholds = [min_sqm for min_sqm, _ in tiers]
+        self.rates = [0.0] + [min(discount, max_discount) for _, discount in tiers]
+
+    def rate(self, quantity_sqm: float) -> float:
+        return self.rates[bisect_right(self.thresholds, quantity_sqm)]
+
+def load_rules(path: str) -> tuple:
+    # -> (правило по умолчанию, {категория: правило})
+    if not path:
+        return DiscountRule([]), {}
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    default_max = config.get("max_discount", 1.0)
+    default = DiscountRule(config.get("tiers", []), default_max)
+    categories = {
+        category: DiscountRule(rule.get("tiers", config.get("tiers", [])), rule.get("max_discount", default_max))
+        for category, rule in config.get("categories", {}).items()
+    }
+    return default, categories
+
+class PricingEngine:
+    # Один расчет цен для /api/quote и для заказов: одинаковые таблица, правила и округление
+    def __init__(self, rules_file: str = PRICING_RULES_FILE, ttl: float = PRICE_TABLE_TTL,
+                 redis_url: Optional[str] = REDIS_URL):
+        self.default_rule, self.category_rules = load_rules(rules_file)
+        self.ttl = ttl
+        self._prices: dict = {}
+        self._loaded_at = 0.0
+        self._generation = 0
+        # Версия цен в Redis, с которой загружена таблица; None - Redis не настроен или недоступен
+        self._version: Optional[int] = None
+        self._redis = redis.from_url(redis_url) if redis_url else None
+        self._lock: Optional[asyncio.Lock] = None
+        self._publishing = set()
+
+    def invalidate(self):
+        self._generation += 1
+        self._loaded_at = 0.0
+        if self._redis is not None:
+            try:
+                task = asyncio.get_running_loop().create_task(self._publish())
+            except RuntimeError:  # коммит вне event loop (скрипты)
+                return
+            self._publishing.add(task)
+            task.add_done_callback(self._publishing.discard)
+
+    async def _publish(self):
+        try:
+            await self._redis.incr(PRICE_VERSION_KEY)
+        except RedisError as e:
+            logger.warning("Price version update failed: %s", e)
+
+    async def _current_version(self) -> Optional[int]:
+        if self._redis is None:
+            return None
+        return int(await self._redis.get(PRICE_VERSION_KEY) or 0)
+
+    def _is_fresh(self, version: Optional[int]) -> bool:
+        return version == self._version and time.monotonic() - self._loaded_at < self.ttl
+
+    async def _read(self, product_ids=None) -> dict:
+        query = select(Product.id, Product.name, Product.category, Product.price_per_sqm)
+        if product_ids is not None:
+            query = query.where(Product.id.in_(list(product_ids)))
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(query)
+            return {row.id: ProductPrice(row.name, row.category, row.price_per_sqm or 0.0) for row in result}
+
+    async def _load(self):
+        generation = self._generation
+        # Версия читается до таблицы: изменение во время чтения даст новую версию и повторную загрузку
+        try:
+            version = await self._current_version()
+        except RedisError as e:
+            logger.warning("Price version check failed: %s", e)
+            version = None
+        prices = await self._read()
+        self._prices = prices
+        # Если во время чтения цены поменялись, таблица сразу считается устаревшей
+        if generation == self._generation:
+            self._loaded_at, self._version = time.monotonic(), version
+        else:
+            self._loaded_at = 0.0
+
+    async def refresh(self, force: bool = False, version: Optional[int] = None):
+        # Перечитывает таблицу один раз, даже если ее ждут много запросов сразу
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if force or not self._is_fresh(version):
+                await self._load()
+
+    async def get_prices(self, product_ids) -> dict:
+        # -> {product_id: ProductPrice} для найденных продуктов из product_ids
+        try:
+            version = await self._current_version()
+        except RedisError as e:
+            # Неизвестно, менялись ли цены в других воркерах: запрошенные продукты читаются из БД
+            logger.warning("Price version check failed: %s", e)
+            return await self._read(product_ids)
+        if not self._is_fresh(version):
+            await self.refresh(version=version)
+        prices = self._prices
+        found = {product_id: prices[product_id] for product_id in product_ids if product_id in prices}
+        missing = [product_id for product_id in product_ids if product_id not in prices]
+        if missing:
+            # Продукт мог появиться в другом воркере уже после загрузки таблицы
+            generation = self._generation
+            loaded = await self._read(missing)
+            found.update(loaded)
+            if generation == self._generation and prices is self._prices:
+                prices.update(loaded)
+        return found
+
+    def rule_for(self, category: Optional[str]) -> DiscountRule:
+        return self.category_rules.get(category, self.default_rule)
+
+    async def price_lines(self, items: list) -> list:
+        # items - пары (product_id, quantity_sqm); для неизвестного продукта в ответе None
+        prices = await self.get_prices({product_id for product_id, _ in items})
+        found = [(product_id, quantity, prices.get(product_id)) for product_id, quantity in items]
+
+        # Колонки считаются по всей корзине сразу, а не поштучными запросами
+        quantities = [quantity for _, quantity, price in found if price is not None]
+        unit_prices = [price.price_per_sqm for _, _, price in found if price is not None]
+        rates = [self.rule_for(price.category).rate(quantity) for _, quantity, price in found if price is not None]
+        subtotals = [round(unit * quantity, 2) for unit, quantity in zip(unit_prices, quantities)]
+        discounts = [round(subtotal * rate, 2) for subtotal, rate in zip(subtotals, rates)]
+
+        computed = iter(zip(subtotals, rates, discounts))
+        lines = []
+        for product_id, quantity, price in found:
+            if price is None:
+                lines.append(None)
+                continue
+            subtotal, rate, discount = next(computed)
+            lines.append(PriceLine(
+                product_id, price.name, price.category, quantity, price.price_per_sqm,
+                subtotal, rate, discount, round(subtotal - discount, 2),
+            ))
+        return lines
+
+pricing_engine = PricingEngine()
+
+@event.listens_for(Session, "after_flush")
+def _track_product_changes(session, flush_context):
+    if any(isinstance(obj, Product) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info["products_changed"] = True
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_price_table(session):
+    # Изменение продуктов через ORM в этом процессе сбрасывает таблицу цен после коммита,
+    # чтобы перечитанная таблица уже содержала новые цены
+    if session.info.pop("products_changed", False):
+        pricing_engine.invalidate()
+
+@event.listens_for(Session, "after_rollback")
+def _forget_product_changes(session):
+    session.info.pop("products_changed", None)
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, EmailStr
-from datetime import datetime
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field, computed_field
+from datetime import date, datetime
+from typing import Any, Literal, Optional, Union
+from images import variant_urls
 
 class ProductBase(BaseModel):
     name: str
@@ -10,6 +11,8 @@ class ProductBase(BaseModel):
     image_url: str
     video_url: Optional[str] = None
     specifications: Optional[str] = None
+    # Структурированные характеристики; если не переданы, разбираются из specifications
+    attributes: Optional[dict[str, Any]] = None
     is_available: bool = True
 
 class ProductCreate(ProductBase):
@@ -19,10 +22,30 @@ class ProductResponse(ProductBase):
     id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
+    image_hash: Optional[str] = Field(None, exclude=True)
+
+    @computed_field
+    @property
+    def image_variants(self) -> dict[str, dict[str, str]]:
+        return variant_urls(self.id, self.image_hash)
     
     class Config:
         from_attributes = True
 
+# Поля, которые можно запросить через ?fields=
+PRODUCT_FIELDS = frozenset(
+    name for name, field in ProductResponse.model_fields.items() if not field.exclude
+) | frozenset(ProductResponse.__pydantic_decorators__.computed_fields)
+
+class FacetValue(BaseModel):
+    value: Union[float, str]
+    count: int
+
+class ProductFacets(BaseModel):
+    category: list[FacetValue]
+    thickness_mm: list[FacetValue]
+    coating: list[FacetValue]
+
 class OrderBase(BaseModel):
     customer_name: str
     customer_email: EmailStr
@@ -44,6 +67,55 @@ class OrderResponse(OrderBase):
     class Config:
         from_attributes = True
 
+class OrderStatusUpdate(BaseModel):
+    status: Literal["pending", "confirmed", "completed", "cancelled"]
+
+class OrderBulkItemResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    total_price: Optional[float] = None
+    error: Optional[str] = None
+
+class OrderBulkResponse(BaseModel):
+    created: int
+    failed: int
+    results: list[OrderBulkItemResult]
+
+class QuoteItem(BaseModel):
+    product_id: int
+    quantity_sqm: float = Field(gt=0)
+
+class QuoteRequest(BaseModel):
+    items: list[QuoteItem]
+
+class QuoteLine(BaseModel):
+    index: int
+    product_id: int
+    quantity_sqm: float
+    name: Optional[str] = None
+    category: Optional[str] = None
+    price_per_sqm: Optional[float] = None
+    subtotal: Optional[float] = None
+    discount_rate: Optional[float] = None
+    discount: Optional[float] = None
+    total: Optional[float] = None
+    error: Optional[str] = None
+
+class QuoteResponse(BaseModel):
+    lines: list[QuoteLine]
+    subtotal: float
+    discount: float
+    total: float
+
+class SalesRow(BaseModel):
+    day: Optional[date] = None
+    product_id: Optional[int] = None
+    source: Optional[str] = None
+    status: Optional[str] = None
+    order_count: int
+    total_sqm: float
+    revenue: float
+
 class UserBase(BaseModel):
     email: EmailStr
     username: str
@@ -60,6 +132,20 @@ class UserResponse(UserBase):
     class Config:
         from_attributes = True
 
+class TelegramUserCreate(BaseModel):
+    telegram_id: int
+    username: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+
+class TelegramUserResponse(TelegramUserCreate):
+    id: int
+    is_active: bool
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -0,0 +1,86 @@
+import os
+import re
+from typing import Optional
+from sqlalchemy import Integer, column, func, literal_column, select, table
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import UnaryExpression
+from database import DATABASE_URL
+from models import Product, product_search_vector
+
+# В SQLite поиск идет по FTS5-таблице с external content, синхронизируемой триггерами;
+# таблица и триггеры создаются миграцией 0001a
+FTS_TABLE = "products_fts"
+
+# Сколько совпадений (с учетом фильтров) ранжируется: при большем их числе ранжируются самые новые
+# продукты. Так стоимость слишком общих запросов не растет с каталогом; 0 - ранжировать все совпадения
+SEARCH_CANDIDATES_LIMIT = int(os.getenv("SEARCH_CANDIDATES_LIMIT", "1000"))
+
+_fts = table(FTS_TABLE, column("rowid", Integer))
+_token_re = re.compile(r"\w+", re.UNICODE)
+
+def fts5_query(q: str) -> str:
+    # Пользовательский ввод превращаем в безопасный запрос FTS5: все слова, поиск по префиксу
+    return " ".join(f'"{token}"*' for token in _token_re.findall(q.lower()))
+
+def _without_index(col):
+    # Унарный плюс в SQLite запрещает использовать индекс по колонке
+    return UnaryExpression(col, operator=operators.custom_op("+"), type_=col.type)
+
+def _product_filters(col, category, min_price, max_price, is_available) -> list:
+    filters = []
+    if category:
+        filters.append(col(Product.category) == category)
+    if min_price is not None:
+        filters.append(col(Product.price_per_sqm) >= min_price)
+    if max_price is not None:
+        filters.append(col(Product.price_per_sqm) <= max_price)
+    if is_available is not None:
+        filters.append(col(Product.is_available) == is_available)
+    return filters
+
+def build_search_query(
+    q: Optional[str] = None,
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    is_available: Optional[bool] = None,
+):
+    filters = _product_filters(lambda col: col, category, min_price, max_price, is_available)
+
+    query = select(Product)
+    matches = None
+
+    # Совпадения со score считаются отдельно (MATERIALIZED), чтобы поиск шел от полнотекстового индекса,
+    # а не от индексов по фильтрам с повторной проверкой MATCH для каждой строки. Фильтры проверяются
+    # там же, до SEARCH_CANDIDATES_LIMIT: ограничение не отбрасывает продукты, подходящие под фильтры
+    if q and q.strip():
+        if DATABASE_URL.startswith("sqlite"):
+            match = fts5_query(q)
+            if match:
+                fts = literal_column(FTS_TABLE)
+                matches = select(_fts.c.rowid.label("id"), func.bm25(fts).label("score")).where(fts.op("MATCH")(match))
+                if filters:
+                    # Иначе при узком фильтре (категория) SQLite идет от ее индекса и заново
+                    # выполняет MATCH для каждой строки, что на больших каталогах занимает секунды
+                    fts_filters = _product_filters(_without_index, category, min_price, max_price, is_available)
+                    matches = matches.join(Product, Product.id == _fts.c.rowid).where(*fts_filters)
+                newest = _fts.c.rowid.desc()
+        else:
+            ts_query = func.websearch_to_tsquery(literal_column("'russian'"), q)
+            vector = product_search_vector(Product.name, Product.description, Product.specifications)
+            # ts_rank: больше - лучше, поэтому инвертируем знак, чтобы сортировать как bm25
+            matches = (
+                select(Product.id.label("id"), (-func.ts_rank(vector, ts_query)).label("score"))
+                .where(vector.op("@@")(ts_query), *filters)
+            )
+            newest = Product.id.desc()
+
+    if matches is not None:
+        if SEARCH_CANDIDATES_LIMIT:
+            # Совпадения идут из индекса по убыванию id, и score считается только для первых
+            # SEARCH_CANDIDATES_LIMIT; если совпадений не больше, ранжирование точное
+            matches = matches.order_by(newest).limit(SEARCH_CANDIDATES_LIMIT)
+        matches = matches.cte("matches").prefix_with("MATERIALIZED")
+        return query.join(matches, matches.c.id == Product.id).order_by(matches.c.score, Product.id)
+
+    return query.where(*filters).order_by(Product.id)
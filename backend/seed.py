@@ -0,0 +1,53 @@
+import asyncio
+from sqlalchemy import select
+from database import AsyncSessionLocal
+from models import Product
+import facets  # noqa: F401 - attributes и счетчики фасетов заполняются событиями сессии
+
+TEST_PRODUCTS = [
+    dict(
+        name="Профнастил С8",
+        description="Универсальный профнастил для кровли и стен. Высокое качество, долговечность.",
+        price_per_sqm=450.0,
+        category="Кровельные материалы",
+        image_url="https://images.pexels.com/photos/186461/pexels-photo-186461.jpeg",
+        specifications="Толщина: 0.5мм, Покрытие: полиэстер",
+    ),
+    dict(
+        name="Металлочерепица Монтеррей",
+        description="Классическая металлочерепица с полимерным покрытием. Идеальна для частных домов.",
+        price_per_sqm=520.0,
+        category="Кровельные материалы",
+        image_url="https://images.pexels.com/photos/323780/pexels-photo-323780.jpeg",
+        specifications="Толщина: 0.5мм, Профиль: Монтеррей",
+    ),
+    dict(
+        name="Сайдинг виниловый",
+        description="Качественный виниловый сайдинг для отделки фасадов. Устойчив к погодным условиям.",
+        price_per_sqm=380.0,
+        category="Фасадные материалы",
+        image_url="https://images.pexels.com/photos/1396122/pexels-photo-1396122.jpeg",
+        specifications="Материал: ПВХ, Длина панели: 3.66м",
+    ),
+]
+
+async def seed_products(db) -> int:
+    # Тестовые продукты добавляются только в пустой каталог
+    result = await db.execute(select(Product.id).limit(1))
+    if result.first():
+        return 0
+    db.add_all(Product(**product) for product in TEST_PRODUCTS)
+    await db.commit()
+    return len(TEST_PRODUCTS)
+
+async def _seed():
+    async with AsyncSessionLocal() as db:
+        added = await seed_products(db)
+    if added:
+        print(f"✅ Тестовые продукты добавлены в базу данных: {added}")
+    else:
+        print("Каталог не пуст, тестовые продукты не добавлены")
+
+if __name__ == "__main__":
+    # Запускается один раз после `alembic upgrade head`, а не при каждом старте воркера
+    asyncio.run(_seed())
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+import httpx
+
+logger = logging.getLogger(__name__)
+
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "10"))
+API_RETRIES = int(os.getenv("API_RETRIES", "3"))
+API_RETRY_BACKOFF = float(os.getenv("API_RETRY_BACKOFF", "0.5"))
+BOT_CACHE_TTL = float(os.getenv("BOT_CACHE_TTL", "60"))
+BOT_CACHE_MAX_ENTRIES = int(os.getenv("BOT_CACHE_MAX_ENTRIES", "512"))
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Ответы 5xx и сетевые ошибки повторяем с экспоненциальной задержкой
+RETRY_STATUS_CODES = {502, 503, 504}
+
+class TTLCache:
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+
+    def get(self, key):
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        return value
+
+    def set(self, key, value):
+        if len(self._entries) >= self.max_entries:
+            # Сначала выбрасываем просроченные, затем самые старые записи
+            now = time.monotonic()
+            self._entries = {k: v for k, v in self._entries.items() if v[0] >= now}
+            while len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def clear(self):
+        self._entries.clear()
+
+def parse_retry_after(value: Optional[str]) -> float:
+    # Поддерживается только форма в секундах, ее и отдает бэкенд
+    try:
+        return max(float(value), 0.0) if value else 0.0
+    except ValueError:
+        return 0.0
+
+class BackendClient:
+    # Один долгоживущий httpx-клиент на весь процесс бота: keep-alive, таймауты и повторы
+    def __init__(self, base_url: str, timeout: float = API_TIMEOUT, retries: int = API_RETRIES,
+                 backoff: float = API_RETRY_BACKOFF, cache_ttl: float = BOT_CACHE_TTL,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = TTLCache(cache_ttl, BOT_CACHE_MAX_ENTRIES)
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._inflight = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0)),
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30),
+                transport=self._transport,
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(self, method: str, path: str, idempotent: bool, **kwargs) -> httpx.Response:
+        attempt = 0
+        while True:
+            retry_after = 0.0
+            try:
+                response = await self.client.request(method, path, **kwargs)
+                if response.status_code not in RETRY_STATUS_CODES or not idempotent or attempt >= self.retries:
+                    return response
+                # 503 от перегруженного бэкенда говорит, когда приходить снова
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                # Запрос не ушел на сервер - повторять безопасно для любого метода
+                if attempt >= self.retries:
+                    raise
+            except httpx.TransportError:
+                if not idempotent or attempt >= self.retries:
+                    raise
+            attempt += 1
+            delay = max(self.backoff * 2 ** (attempt - 1), retry_after)
+            logger.warning("Backend request %s %s failed, retry %d in %.1fs", method, path, attempt, delay)
+            await asyncio.sleep(delay)
+
+    async def _cached(self, key, load):
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        # Сотни одновременных нажатий на одну карточку - один запрос к бэкенду
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load_into_cache(key, load))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _load_into_cache(self, key, load):
+        value = await load()
+        self.cache.set(key, value)
+        return value
+
+    async def get_json(self, path: str, params: Optional[dict] = None, use_cache: bool = True):
+        if not use_cache:
+            return await self._fetch_json(path, params)
+        key = (path, tuple(sorted((params or {}).items())))
+        return await self._cached(key, lambda: self._fetch_json(path, params))
+
+    async def _fetch_json(self, path: str, params: Optional[dict]):
+        response = await self._request("GET", path, idempotent=True, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def get_products_page(self, limit: int, cursor: Optional[str] = None, skip: int = 0,
+                                fields: Optional[str] = None) -> tuple:
+        # -> (продукты, курсор следующей страницы или None); страница кэшируется вместе с курсором
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        elif skip:
+            params["skip"] = skip
+        if fields:
+            params["fields"] = fields
+
+        async def load():
+            response = await self._request("GET", "/api/products", idempotent=True, params=params)
+            response.raise_for_status()
+            return response.json(), response.headers.get(NEXT_CURSOR_HEADER)
+
+        return await self._cached(("/api/products#page", tuple(sorted(params.items()))), load)
+
+    async def get_products(self, limit: int = 10):
+        return await self.get_json("/api/products", params={"limit": limit})
+
+    async def get_product(self, product_id):
+        return await self.get_json(f"/api/products/{product_id}")
+
+    async def register_user(self, user: dict) -> httpx.Response:
+        # Повторная регистрация только обновляет пользователя, поэтому запрос можно повторять
+        return await self._request("POST", "/api/telegram/users", idempotent=True, json=user)
+
+    async def create_order(self, order_data: dict) -> httpx.Response:
+        return await self._request("POST", "/api/orders", idempotent=False, json=order_data)
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from bisect import bisect_left
+from typing import Optional
+from api import BackendClient, TTLCache
+
+# Продуктов на странице каталога в боте
+BOT_CATALOG_PAGE_SIZE = int(os.getenv("BOT_CATALOG_PAGE_SIZE", "8"))
+# Как часто перестраивать индекс inline-поиска; пока он строится, отвечает старый
+BOT_SEARCH_INDEX_TTL = float(os.getenv("BOT_SEARCH_INDEX_TTL", "300"))
+
+# Странице каталога нужны только эти поля - ответ бэкенда остается маленьким
+PAGE_FIELDS = "id,name,price_per_sqm"
+SEARCH_FIELDS = "id,name,description,price_per_sqm,category,specifications,image_variants"
+INDEX_PAGE_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+# Данные кнопок короткие (лимит Telegram - 64 байта): номер страницы, а не курсор
+PAGE_CALLBACK_PREFIX = "p:"
+
+def page_callback(page: int) -> str:
+    return f"{PAGE_CALLBACK_PREFIX}{page}"
+
+def parse_page_callback(data: str) -> int:
+    try:
+        return max(int(data[len(PAGE_CALLBACK_PREFIX):]), 0)
+    except ValueError:
+        return 0
+
+class CatalogPages:
+    # Листание каталога по курсорам бэкенда (X-Next-Cursor): курсор страницы N+1 запоминается при показе N
+    def __init__(self, api: BackendClient, page_size: int = BOT_CATALOG_PAGE_SIZE):
+        self.api = api
+        self.page_size = page_size
+        self._cursors = TTLCache(BOT_SEARCH_INDEX_TTL, 1024)
+
+    async def get_page(self, page: int) -> tuple:
+        # -> (продукты страницы, есть ли следующая)
+        cursor = self._cursors.get(page) if page else None
+        if page and cursor is None:
+            # Курсор неизвестен (рестарт бота, кнопка из старого сообщения, другой воркер) - одна страница через skip
+            products, next_cursor = await self.api.get_products_page(
+                self.page_size, skip=page * self.page_size, fields=PAGE_FIELDS
+            )
+        else:
+            products, next_cursor = await self.api.get_products_page(self.page_size, cursor=cursor, fields=PAGE_FIELDS)
+        if next_cursor:
+            self._cursors.set(page + 1, next_cursor)
+        return products, next_cursor is not None
+
+def tokenize(text: str) -> list:
+    return re.findall(r"\w+", (text or "").lower().replace("ё", "е"))
+
+class SearchIndex:
+    # Индекс inline-поиска в памяти бота: запросы по мере набора текста не ходят в бэкенд
+    def __init__(self, api: BackendClient, ttl: float = BOT_SEARCH_INDEX_TTL):
+        self.api = api
+        self.ttl = ttl
+        self._products: list = []
+        self._tokens: list = []  # отсортированные пары (слово, номер продукта)
+        self._name_tokens: list = []
+        self._loaded_at: Optional[float] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def _load(self):
+        products = []
+        cursor = None
+        while True:
+            page, cursor = await self.api.get_products_page(INDEX_PAGE_SIZE, cursor=cursor, fields=SEARCH_FIELDS)
+            products.extend(page)
+            if not cursor:
+                break
+        tokens = set()
+        name_tokens = []
+        for position, product in enumerate(products):
+            text = " ".join(str(product.get(field) or "") for field in ("name", "category", "description", "specifications"))
+            tokens.update((token, position) for token in tokenize(text))
+            name_tokens.append(set(tokenize(product.get("name"))))
+        self._products, self._tokens, self._name_tokens = products, sorted(tokens), name_tokens
+        self._loaded_at = time.monotonic()
+
+    async def refresh(self):
+        # Одна перестройка на все одновременные запросы
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._load())
+        await asyncio.shield(self._refresh_task)
+
+    async def ensure_loaded(self):
+        if self._loaded_at is None:
+            await self.refresh()
+        elif time.monotonic() - self._loaded_at >= self.ttl and (self._refresh_task is None or self._refresh_task.done()):
+            # Устаревший индекс отвечает, пока в фоне строится новый
+            self._refresh_task = asyncio.ensure_future(self._load())
+            self._refresh_task.add_done_callback(self._log_refresh_error)
+
+    @staticmethod
+    def _log_refresh_error(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Search index refresh failed: %r", task.exception())
+
+    def _matching(self, prefix: str) -> set:
+        # Продукты, у которых есть слово, начинающееся с prefix: запрос приходит по мере набора
+        positions = set()
+        index = bisect_left(self._tokens, (prefix,))
+        while index < len(self._tokens) and self._tokens[index][0].startswith(prefix):
+            positions.add(self._tokens[index][1])
+            index += 1
+        return positions
+
+    async def search(self, query: str, limit: int) -> list:
+        await self.ensure_loaded()
+        words = tokenize(query)
+        if not words:
+            return self._products[:limit]
+        positions = None
+        for word in words:
+            matched = self._matching(word)
+            positions = matched if positions is None else positions & matched
+            if not positions:
+                return []
+        # Совпадения в названии выше совпадений в описании, дальше - порядок каталога
+        def rank(position):
+            name_tokens = self._name_tokens[position]
+            in_name = sum(any(token.startswith(word) for token in name_tokens) for word in words)
+            return -in_name, position
+        return [self._products[position] for position in sorted(positions, key=rank)[:limit]]
@@ -1,15 +1,24 @@
 import asyncio
+import html
 import logging
-from aiogram import Bot, Dispatcher, types
-from aiogram.filters import CommandStart, Command
-from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram import Bot, Dispatcher, Router, types
+from aiogram.filters import CommandStart, Command, CommandObject
+from aiogram.types import (
+    Message, InlineKeyboardMarkup, InlineKeyboardButton, InlineQueryResultArticle, InputTextMessageContent,
+)
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
-import httpx
+from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from redis.asyncio import Redis
 import os
 from dotenv import load_dotenv
 
+from api import BackendClient
+from catalog import PAGE_CALLBACK_PREFIX, CatalogPages, SearchIndex, page_callback, parse_page_callback
+
 load_dotenv()
 
 # Configure logging
@@ -19,10 +28,39 @@ logging.basicConfig(level=logging.INFO)
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
 
-# Initialize bot and dispatcher
+# Режим работы: polling (по умолчанию, один процесс) или webhook (несколько воркеров за балансировщиком)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Хранилище FSM: memory или redis (общее для всех воркеров, переживает рестарт)
+BOT_FSM_STORAGE = os.getenv("BOT_FSM_STORAGE", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+# Через сколько секунд брошенная форма заказа удаляется из Redis
+ORDER_FORM_TTL = int(os.getenv("ORDER_FORM_TTL", "3600"))
+
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Публичный адрес, например https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", "8080"))
+
+# Inline-режим (@бот запрос): включается у @BotFather командой /setinline
+BOT_INLINE_RESULTS = int(os.getenv("BOT_INLINE_RESULTS", "20"))
+# Сколько секунд Telegram сам кэширует ответ на одинаковый запрос
+BOT_INLINE_CACHE_TIME = int(os.getenv("BOT_INLINE_CACHE_TIME", "60"))
+
+def create_storage(redis: Redis = None):
+    if redis is None and BOT_FSM_STORAGE != "redis":
+        return MemoryStorage()
+    if redis is None:
+        redis = Redis.from_url(REDIS_URL)
+    return RedisStorage(redis, state_ttl=ORDER_FORM_TTL, data_ttl=ORDER_FORM_TTL)
+
+# Initialize bot
 bot = Bot(token=BOT_TOKEN)
-storage = MemoryStorage()
-dp = Dispatcher(storage=storage)
+
+# Общий HTTP-клиент к backend с кэшем каталога
+api = BackendClient(API_BASE_URL)
+catalog_pages = CatalogPages(api)
+search_index = SearchIndex(api)
 
 # States for order form
 class OrderForm(StatesGroup):
@@ -31,8 +69,26 @@ class OrderForm(StatesGroup):
     waiting_for_email = State()
     waiting_for_message = State()
 
-@dp.message(CommandStart())
-async def cmd_start(message: Message):
+async def cmd_start(message: Message, command: CommandObject):
+    # Пользователь попадает в список рассылок; недоступный backend не должен ломать приветствие
+    try:
+        response = await api.register_user({
+            "telegram_id": message.from_user.id,
+            "username": message.from_user.username,
+            "first_name": message.from_user.first_name,
+            "last_name": message.from_user.last_name,
+        })
+        response.raise_for_status()
+    except Exception as e:
+        logging.warning("Failed to register Telegram user %s: %r", message.from_user.id, e)
+
+    # Ссылка t.me/<бот>?start=p<id> из результатов inline-поиска открывает карточку продукта
+    if command.args and command.args.startswith("p") and command.args[1:].isdigit():
+        await send_product(message.bot, message.chat.id, int(command.args[1:]))
+        return
+    await send_main_menu(message)
+
+async def send_main_menu(message: Message):
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🏠 Каталог продукции", callback_data="catalog")],
         [InlineKeyboardButton(text="📞 Связаться с нами", callback_data="contact")],
@@ -46,80 +102,149 @@ async def cmd_start(message: Message):
         reply_markup=keyboard
     )
 
-@dp.callback_query(lambda c: c.data == "catalog")
+async def replace_message(callback_query: types.CallbackQuery, text: str, keyboard: InlineKeyboardMarkup, parse_mode: str):
+    # Сообщение с фото (карточка продукта) нельзя превратить в текстовое - отправляем новое
+    if callback_query.message.photo:
+        await callback_query.message.delete()
+        await callback_query.bot.send_message(callback_query.from_user.id, text, reply_markup=keyboard, parse_mode=parse_mode)
+    else:
+        await callback_query.message.edit_text(text, reply_markup=keyboard, parse_mode=parse_mode)
+
 async def show_catalog(callback_query: types.CallbackQuery):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(f"{API_BASE_URL}/api/products")
-            products = response.json()
-            
-            if not products:
-                await callback_query.message.edit_text("Каталог пока пуст.")
-                return
-            
-            text = "🏠 **Каталог продукции:**\n\n"
-            keyboard_buttons = []
-            
-            for product in products[:10]:  # Показываем первые 10 товаров
-                text += f"**{product['name']}**\n"
-                text += f"💰 {product['price_per_sqm']} руб/м²\n"
-                text += f"{product['description'][:100]}...\n\n"
-                
-                keyboard_buttons.append([
-                    InlineKeyboardButton(
-                        text=f"🛒 {product['name']}", 
-                        callback_data=f"product_{product['id']}"
-                    )
-                ])
-            
+    page = parse_page_callback(callback_query.data) if callback_query.data != "catalog" else 0
+    try:
+        # Страница - один небольшой запрос к бэкенду (только id, name, price_per_sqm) или ноль, если она в кэше
+        products, has_next = await catalog_pages.get_page(page)
+        await callback_query.answer()
+
+        if not products:
+            text = "Каталог пока пуст." if page == 0 else "Больше товаров нет."
+            keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="🔙 Назад", callback_data=page_callback(page - 1) if page else "back_to_menu")]
+            ])
+            await replace_message(callback_query, text, keyboard, parse_mode="HTML")
+            return
+        
+        text = f"🏠 <b>Каталог продукции</b> · страница {page + 1}\n\n"
+        keyboard_buttons = []
+        
+        for number, product in enumerate(products, start=page * catalog_pages.page_size + 1):
+            text += f"{number}. {html.escape(product['name'])} - {product['price_per_sqm']} руб/м²\n"
             keyboard_buttons.append([
-                InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_menu")
+                InlineKeyboardButton(
+                    text=f"🛒 {product['name']}", 
+                    callback_data=f"product_{product['id']}_{page}"
+                )
             ])
-            
-            keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
-            await callback_query.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
-            
-        except Exception as e:
-            await callback_query.message.edit_text("Ошибка загрузки каталога. Попробуйте позже.")
+        
+        navigation = []
+        if page:
+            navigation.append(InlineKeyboardButton(text="◀️ Назад", callback_data=page_callback(page - 1)))
+        if has_next:
+            navigation.append(InlineKeyboardButton(text="Вперед ▶️", callback_data=page_callback(page + 1)))
+        if navigation:
+            keyboard_buttons.append(navigation)
+        keyboard_buttons.append([
+            InlineKeyboardButton(text="🔙 В меню", callback_data="back_to_menu")
+        ])
+        
+        keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+        await replace_message(callback_query, text, keyboard, parse_mode="HTML")
+        
+    except Exception as e:
+        logging.warning("Failed to show catalog page %s: %r", page, e)
+        await callback_query.answer("Ошибка загрузки каталога. Попробуйте позже.", show_alert=True)
+
+def product_card(product: dict) -> tuple:
+    # -> (текст, адрес фото или None)
+    text = f"🏠 **{product['name']}**\n\n"
+    text += f"📝 {product['description']}\n\n"
+    text += f"💰 **Цена:** {product['price_per_sqm']} руб/м²\n"
+    text += f"📂 **Категория:** {product['category']}\n"
+    
+    if product.get('specifications'):
+        text += f"🔧 **Характеристики:** {product['specifications']}\n"
+    
+    # Telegram скачивает картинку сам, поэтому отдаем уменьшенный вариант, если у него публичный адрес
+    photo = product.get('image_url')
+    medium = (product.get('image_variants') or {}).get('medium', {}).get('jpeg')
+    if medium and medium.startswith('http'):
+        photo = medium
+    return text, photo
+
+def product_keyboard(product_id, page: int = 0) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🛒 Заказать", callback_data=f"order_{product_id}")],
+        [InlineKeyboardButton(text="🔙 К каталогу", callback_data=page_callback(page))]
+    ])
+
+async def send_product(bot: Bot, chat_id: int, product_id: int):
+    try:
+        product = await api.get_product(product_id)
+    except Exception:
+        await bot.send_message(chat_id, "Товар не найден.")
+        return
+    text, photo = product_card(product)
+    if photo:
+        await bot.send_photo(chat_id, photo=photo, caption=text, reply_markup=product_keyboard(product_id), parse_mode="Markdown")
+    else:
+        await bot.send_message(chat_id, text, reply_markup=product_keyboard(product_id), parse_mode="Markdown")
 
-@dp.callback_query(lambda c: c.data.startswith("product_"))
 async def show_product(callback_query: types.CallbackQuery):
-    product_id = callback_query.data.split("_")[1]
+    # product_<id>_<страница>; в старых сообщениях страницы нет
+    parts = callback_query.data.split("_")
+    product_id = parts[1]
+    page = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 0
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(f"{API_BASE_URL}/api/products/{product_id}")
-            product = response.json()
-            
-            text = f"🏠 **{product['name']}**\n\n"
-            text += f"📝 {product['description']}\n\n"
-            text += f"💰 **Цена:** {product['price_per_sqm']} руб/м²\n"
-            text += f"📂 **Категория:** {product['category']}\n"
-            
-            if product.get('specifications'):
-                text += f"🔧 **Характеристики:** {product['specifications']}\n"
-            
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="🛒 Заказать", callback_data=f"order_{product_id}")],
-                [InlineKeyboardButton(text="🔙 К каталогу", callback_data="catalog")]
-            ])
+    try:
+        product = await api.get_product(product_id)
+        text, photo = product_card(product)
+        keyboard = product_keyboard(product_id, page)
+        
+        if photo:
+            await callback_query.message.delete()
+            await callback_query.bot.send_photo(
+                callback_query.from_user.id,
+                photo=photo,
+                caption=text,
+                reply_markup=keyboard,
+                parse_mode="Markdown"
+            )
+        else:
+            await callback_query.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
             
-            if product.get('image_url'):
-                await callback_query.message.delete()
-                await bot.send_photo(
-                    callback_query.from_user.id,
-                    photo=product['image_url'],
-                    caption=text,
-                    reply_markup=keyboard,
-                    parse_mode="Markdown"
-                )
-            else:
-                await callback_query.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
-                
-        except Exception as e:
-            await callback_query.message.edit_text("Ошибка загрузки товара. Попробуйте позже.")
+    except Exception as e:
+        await callback_query.message.edit_text("Ошибка загрузки товара. Попробуйте позже.")
+
+async def inline_search(inline_query: types.InlineQuery):
+    # @бот профнастил - поиск по индексу в памяти бота, без запроса к бэкенду на каждую букву
+    try:
+        products = await search_index.search(inline_query.query, BOT_INLINE_RESULTS)
+    except Exception as e:
+        logging.warning("Inline search failed: %r", e)
+        products = []
+    me = await inline_query.bot.me()
+    results = []
+    for product in products:
+        description = f"{product['price_per_sqm']} руб/м²"
+        if product.get('category'):
+            description += f" · {product['category']}"
+        thumbnail = ((product.get('image_variants') or {}).get('thumb') or {}).get('jpeg')
+        results.append(InlineQueryResultArticle(
+            id=str(product['id']),
+            title=product['name'],
+            description=description,
+            thumbnail_url=thumbnail if thumbnail and thumbnail.startswith('http') else None,
+            input_message_content=InputTextMessageContent(
+                message_text=f"🏠 <b>{html.escape(product['name'])}</b>\n💰 {description}",
+                parse_mode="HTML",
+            ),
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="🛒 Подробнее и заказ", url=f"https://t.me/{me.username}?start=p{product['id']}")]
+            ]),
+        ))
+    await inline_query.answer(results, cache_time=BOT_INLINE_CACHE_TIME)
 
-@dp.callback_query(lambda c: c.data.startswith("order_"))
 async def start_order(callback_query: types.CallbackQuery, state: FSMContext):
     product_id = callback_query.data.split("_")[1]
     await state.update_data(product_id=product_id)
@@ -129,25 +254,21 @@ async def start_order(callback_query: types.CallbackQuery, state: FSMContext):
     )
     await state.set_state(OrderForm.waiting_for_name)
 
-@dp.message(OrderForm.waiting_for_name)
 async def process_name(message: Message, state: FSMContext):
     await state.update_data(name=message.text)
     await message.answer("📞 Теперь укажите ваш номер телефона:")
     await state.set_state(OrderForm.waiting_for_phone)
 
-@dp.message(OrderForm.waiting_for_phone)
 async def process_phone(message: Message, state: FSMContext):
     await state.update_data(phone=message.text)
     await message.answer("📧 Укажите ваш email:")
     await state.set_state(OrderForm.waiting_for_email)
 
-@dp.message(OrderForm.waiting_for_email)
 async def process_email(message: Message, state: FSMContext):
     await state.update_data(email=message.text)
     await message.answer("💬 Добавьте комментарий к заказу (или отправьте 'пропустить'):")
     await state.set_state(OrderForm.waiting_for_message)
 
-@dp.message(OrderForm.waiting_for_message)
 async def process_message(message: Message, state: FSMContext):
     data = await state.get_data()
     
@@ -161,23 +282,21 @@ async def process_message(message: Message, state: FSMContext):
         "source": "telegram"
     }
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(f"{API_BASE_URL}/api/orders", json=order_data)
-            if response.status_code == 200:
-                await message.answer(
-                    "✅ Заказ успешно оформлен!\n\n"
-                    "Наш менеджер свяжется с вами в ближайшее время.\n"
-                    "Спасибо за обращение! 🙏"
-                )
-            else:
-                await message.answer("❌ Ошибка при оформлении заказа. Попробуйте позже.")
-        except Exception as e:
+    try:
+        response = await api.create_order(order_data)
+        if response.status_code == 200:
+            await message.answer(
+                "✅ Заказ успешно оформлен!\n\n"
+                "Наш менеджер свяжется с вами в ближайшее время.\n"
+                "Спасибо за обращение! 🙏"
+            )
+        else:
             await message.answer("❌ Ошибка при оформлении заказа. Попробуйте позже.")
-    
+    except Exception as e:
+        await message.answer("❌ Ошибка при оформлении заказа. Попробуйте позже.")
+
     await state.clear()
 
-@dp.callback_query(lambda c: c.data == "contact")
 async def show_contact(callback_query: types.CallbackQuery):
     text = "📞 **Контактная информация:**\n\n"
     text += "🏢 TriFormStack\n"
@@ -193,12 +312,59 @@ async def show_contact(callback_query: types.CallbackQuery):
     
     await callback_query.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
 
-@dp.callback_query(lambda c: c.data == "back_to_menu")
 async def back_to_menu(callback_query: types.CallbackQuery):
-    await cmd_start(callback_query.message)
+    # Не cmd_start: у сообщения бота from_user - сам бот, его нельзя регистрировать
+    await send_main_menu(callback_query.message)
+
+async def on_startup(bot: Bot):
+    if BOT_MODE == "webhook" and WEBHOOK_URL:
+        # Вызов идемпотентен, поэтому его может выполнять каждый воркер
+        await bot.set_webhook(f"{WEBHOOK_URL}{WEBHOOK_PATH}", secret_token=WEBHOOK_SECRET)
+
+async def on_shutdown(dispatcher: Dispatcher):
+    await api.close()
+    await dispatcher.storage.close()
+
+def create_router() -> Router:
+    # Новый роутер на каждый диспетчер: aiogram не дает подключить один роутер к двум диспетчерам
+    router = Router()
+    router.message.register(cmd_start, CommandStart())
+    router.callback_query.register(show_catalog, lambda c: c.data == "catalog" or c.data.startswith(PAGE_CALLBACK_PREFIX))
+    router.callback_query.register(show_product, lambda c: c.data.startswith("product_"))
+    router.inline_query.register(inline_search)
+    router.callback_query.register(start_order, lambda c: c.data.startswith("order_"))
+    router.message.register(process_name, OrderForm.waiting_for_name)
+    router.message.register(process_phone, OrderForm.waiting_for_phone)
+    router.message.register(process_email, OrderForm.waiting_for_email)
+    router.message.register(process_message, OrderForm.waiting_for_message)
+    router.callback_query.register(show_contact, lambda c: c.data == "contact")
+    router.callback_query.register(back_to_menu, lambda c: c.data == "back_to_menu")
+    router.startup.register(on_startup)
+    router.shutdown.register(on_shutdown)
+    return router
+
+def create_dispatcher(storage=None) -> Dispatcher:
+    # storage - хранилище FSM (по умолчанию по BOT_FSM_STORAGE); в тестах - RedisStorage на fakeredis
+    dispatcher = Dispatcher(storage=storage or create_storage())
+    dispatcher.include_router(create_router())
+    return dispatcher
+
+dp = create_dispatcher()
+
+def create_webhook_app(dispatcher: Dispatcher = None, bot_instance: Bot = None) -> web.Application:
+    # aiohttp-приложение, принимающее обновления Telegram на WEBHOOK_PATH
+    dispatcher = dispatcher or dp
+    bot_instance = bot_instance or bot
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dispatcher, bot=bot_instance, secret_token=WEBHOOK_SECRET).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dispatcher, bot=bot_instance)
+    return app
 
 async def main():
     await dp.start_polling(bot)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if BOT_MODE == "webhook":
+        web.run_app(create_webhook_app(), host=WEBAPP_HOST, port=WEBAPP_PORT)
+    else:
+        asyncio.run(main())
\ No newline at end of file
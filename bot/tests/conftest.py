@@ -0,0 +1,10 @@
+import os
+import sys
+
+# main.py читает настройки при импорте
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:TEST-token")
+os.environ["BOT_MODE"] = "polling"
+os.environ["BOT_FSM_STORAGE"] = "memory"
+os.environ["WEBHOOK_SECRET"] = "test-secret"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
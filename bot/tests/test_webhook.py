@@ -0,0 +1,188 @@
+import asyncio
+import json
+import time
+
+import httpx
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.fsm.storage.base import StorageKey
+from aiohttp.test_utils import TestClient, TestServer
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
+
+import main
+from api import BackendClient
+
+USER_ID = 1001
+
+class RecordingSession(BaseSession):
+    # Вместо запросов к Telegram запоминает вызванные методы
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls.append(method)
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+class FakeBackend:
+    # Минимальный backend: регистрация пользователей и прием заказов
+    def __init__(self):
+        self.orders = []
+        self.users = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/api/orders":
+            self.orders.append(json.loads(request.content))
+            return httpx.Response(200, json={"id": len(self.orders)})
+        if request.url.path == "/api/telegram/users":
+            self.users.append(json.loads(request.content))
+            return httpx.Response(200, json={})
+        return httpx.Response(404, json={"detail": "Not found"})
+
+def message_update(update_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": USER_ID, "type": "private"},
+            "from": {"id": USER_ID, "is_bot": False, "first_name": "Иван"},
+            "text": text,
+            **({"entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]}
+               if text.startswith("/") else {}),
+        },
+    }
+
+def callback_update(update_id: int, data: str) -> dict:
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "chat_instance": "1",
+            "from": {"id": USER_ID, "is_bot": False, "first_name": "Иван"},
+            "data": data,
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": USER_ID, "type": "private"},
+                "from": {"id": 42, "is_bot": True, "first_name": "TriFormStack"},
+                "text": "Каталог",
+            },
+        },
+    }
+
+async def wait_for(condition, timeout: float = 5):
+    # Обновления обрабатываются в фоне после ответа 200
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "update was not handled"
+        await asyncio.sleep(0.01)
+
+class Worker:
+    # Отдельный диспетчер и aiohttp-приложение, как у одного из воркеров за балансировщиком
+    def __init__(self, server: FakeServer):
+        self.storage = main.create_storage(FakeRedis(server=server))
+        self.session = RecordingSession()
+        app = main.create_webhook_app(main.create_dispatcher(self.storage), Bot(main.BOT_TOKEN, session=self.session))
+        self.client = TestClient(TestServer(app))
+
+    async def post(self, update: dict):
+        calls = len(self.session.calls)
+        response = await self.client.post(
+            main.WEBHOOK_PATH, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": main.WEBHOOK_SECRET},
+        )
+        assert response.status == 200
+        await wait_for(lambda: len(self.session.calls) > calls)
+
+def test_order_form_across_webhook_workers(monkeypatch):
+    backend = FakeBackend()
+    monkeypatch.setattr(main, "api", BackendClient("http://backend", transport=httpx.MockTransport(backend)))
+
+    async def scenario():
+        server = FakeServer()
+        first, second = Worker(server), Worker(server)
+        await first.client.start_server()
+        await second.client.start_server()
+        try:
+            await first.post(message_update(1, "/start"))
+            assert [call.__class__.__name__ for call in first.session.calls] == ["SendMessage"]
+            assert backend.users[0]["telegram_id"] == USER_ID
+
+            # Шаги формы приходят на разные воркеры - состояние общее, в Redis
+            await first.post(callback_update(2, "order_7"))
+            await second.post(message_update(3, "Иван"))
+            await first.post(message_update(4, "+79990000000"))
+            await second.post(message_update(5, "ivan@example.com"))
+
+            key = StorageKey(bot_id=123456, chat_id=USER_ID, user_id=USER_ID)
+            assert await second.storage.get_state(key) == main.OrderForm.waiting_for_message.state
+            assert await first.storage.get_data(key) == {
+                "product_id": "7", "name": "Иван", "phone": "+79990000000", "email": "ivan@example.com",
+            }
+
+            await first.post(message_update(6, "пропустить"))
+            assert backend.orders == [{
+                "customer_name": "Иван",
+                "customer_phone": "+79990000000",
+                "customer_email": "ivan@example.com",
+                "product_id": 7,
+                "quantity_sqm": 1.0,
+                "message": "",
+                "source": "telegram",
+            }]
+            assert first.session.calls[-1].text.startswith("✅ Заказ успешно оформлен")
+            assert await second.storage.get_state(key) is None
+        finally:
+            await first.client.close()
+            await second.client.close()
+
+    asyncio.run(scenario())
+
+def test_webhook_rejects_wrong_secret():
+    async def scenario():
+        worker = Worker(FakeServer())
+        await worker.client.start_server()
+        try:
+            response = await worker.client.post(
+                main.WEBHOOK_PATH, json=message_update(1, "/start"),
+                headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"},
+            )
+            assert response.status == 401
+            assert worker.session.calls == []
+        finally:
+            await worker.client.close()
+
+    asyncio.run(scenario())
+
+def test_order_form_expires_after_ttl(monkeypatch):
+    # Брошенная на середине форма не остается в Redis навсегда
+    monkeypatch.setattr(main, "api", BackendClient("http://backend", transport=httpx.MockTransport(FakeBackend())))
+    monkeypatch.setattr(main, "ORDER_FORM_TTL", 1)
+
+    async def scenario():
+        worker = Worker(FakeServer())
+        await worker.client.start_server()
+        try:
+            await worker.post(callback_update(1, "order_7"))
+            await worker.post(message_update(2, "Иван"))
+
+            key = StorageKey(bot_id=123456, chat_id=USER_ID, user_id=USER_ID)
+            redis = worker.storage.redis
+            for part in ("state", "data"):
+                ttl = await redis.pttl(worker.storage.key_builder.build(key, part))
+                assert 0 < ttl <= main.ORDER_FORM_TTL * 1000
+
+            await asyncio.sleep(main.ORDER_FORM_TTL + 0.1)
+            assert await worker.storage.get_state(key) is None
+            assert await worker.storage.get_data(key) == {}
+        finally:
+            await worker.client.close()
+
+    asyncio.run(scenario())
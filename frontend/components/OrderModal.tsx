@@ -5,7 +5,7 @@ import { Dialog, Transition } from '@headlessui/react'
 import { X, Calculator, ShoppingCart } from 'lucide-react'
 import { useForm } from 'react-hook-form'
 import { Product } from '@/types'
-import { createOrder } from '@/lib/api'
+import { createOrder, getImageUrl } from '@/lib/api'
 import toast from 'react-hot-toast'
 
 interface OrderModalProps {
@@ -104,7 +104,7 @@ export default function OrderModal({ product, isOpen, onClose }: OrderModalProps
                   <div className="bg-gray-50 rounded-lg p-4 mb-6">
                     <div className="flex items-center space-x-4">
                       <img
-                        src={product.image_url}
+                        src={getImageUrl(product, 'thumb')}
                         alt={product.name}
                         className="w-16 h-16 object-cover rounded-lg"
                       />
@@ -5,7 +5,7 @@ import { ShoppingCart, Eye, Calculator } from 'lucide-react'
 import ProductModal from './ProductModal'
 import OrderModal from './OrderModal'
 import { Product } from '@/types'
-import { getProducts } from '@/lib/api'
+import { getProducts, getImageUrl } from '@/lib/api'
 import toast from 'react-hot-toast'
 
 export default function ProductCatalog() {
@@ -73,7 +73,8 @@ export default function ProductCatalog() {
               {/* Изображение */}
               <div className="relative h-64 overflow-hidden">
                 <img
-                  src={product.image_url}
+                  src={getImageUrl(product, 'thumb')}
+                  loading="lazy"
                   alt={product.name}
                   className="w-full h-full object-cover group-hover:scale-110 transition-transform duration-300"
                 />
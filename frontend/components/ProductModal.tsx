@@ -4,6 +4,7 @@ import { Fragment } from 'react'
 import { Dialog, Transition } from '@headlessui/react'
 import { X, ShoppingCart, Package, Ruler, Award } from 'lucide-react'
 import { Product } from '@/types'
+import { getImageUrl } from '@/lib/api'
 
 interface ProductModalProps {
   product: Product | null
@@ -55,7 +56,7 @@ export default function ProductModal({ product, isOpen, onClose, onOrder }: Prod
                     {/* Изображение */}
                     <div className="relative h-96 md:h-full">
                       <img
-                        src={product.image_url}
+                        src={getImageUrl(product, 'medium')}
                         alt={product.name}
                         className="w-full h-full object-cover"
                       />
@@ -20,6 +20,13 @@ export const getProduct = async (id: number): Promise<Product> => {
   return response.data
 }
 
+// Уменьшенные варианты картинок (webp); ссылки от backend могут быть относительными
+export const getImageUrl = (product: Product, variant: 'thumb' | 'medium'): string => {
+  const url = product.image_variants?.[variant]?.webp
+  if (!url) return product.image_url
+  return url.startsWith('/') ? `${API_BASE_URL}${url}` : url
+}
+
 export const createOrder = async (order: OrderCreate) => {
   const response = await api.post('/api/orders', order)
   return response.data
@@ -1,3 +1,8 @@
+export interface ImageVariant {
+  webp: string
+  jpeg: string
+}
+
 export interface Product {
   id: number
   name: string
@@ -7,9 +12,14 @@ export interface Product {
   image_url: string
   video_url?: string
   specifications?: string
+  attributes?: Record<string, number | string>
   is_available: boolean
   created_at: string
   updated_at?: string
+  image_variants?: {
+    thumb: ImageVariant
+    medium: ImageVariant
+  }
 }
 
 export interface Order {